@@ -0,0 +1,169 @@
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, rate, burst, now):
+        """Take one token; return 0 on success or the seconds until one is available."""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class RouteLimit:
+    """Concurrency limit for one class of routes, with a bounded wait queue."""
+
+    def __init__(self, concurrency, queue, queue_timeout):
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+
+class AdmissionControl:
+    """Per-client rate limiting and per-route-class admission control.
+
+    Each request is first charged to its client's token bucket (``rate``
+    requests per second, bursts up to ``burst``); an empty bucket answers
+    429. ``classify(method, path)`` then names the route class, whose
+    ``RouteLimit`` caps how many requests run at once. Requests beyond the
+    cap wait in a queue of at most ``queue`` entries for up to
+    ``queue_timeout`` seconds; a full queue or an expired wait answers 503.
+    Both carry ``Retry-After``. Routes classified as ``None`` are exempt.
+    Shed requests are counted per class and reason in ``shed``.
+    """
+
+    def __init__(self, classify, limits, rate=0.0, burst=1.0, max_clients=10000,
+                 trust_forwarded_for=False):
+        self.classify = classify
+        self.limits = limits
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.trust_forwarded_for = trust_forwarded_for
+        self.admitted = {}
+        self.shed = {}
+        self._buckets = OrderedDict()
+
+    async def handle(self, app, scope, receive, send):
+        name = self.classify(scope["method"], scope["path"])
+        if name is None:
+            await app(scope, receive, send)
+            return
+
+        if self.rate > 0:
+            wait = self._take_token(self._client(scope))
+            if wait:
+                await self._reject(send, name, "rate_limited", 429, "Too many requests", wait)
+                return
+
+        limit = self.limits[name]
+        # locked() also covers a slot just released to a waiter that has not
+        # woken up yet; a request arriving then joins the counted queue
+        # instead of waiting on the semaphore unbounded and uncounted.
+        if limit._semaphore.locked():
+            if limit.waiting >= limit.queue:
+                await self._reject(send, name, "queue_full", 503, "Server busy", limit.queue_timeout)
+                return
+            limit.waiting += 1
+            try:
+                await asyncio.wait_for(limit._semaphore.acquire(), limit.queue_timeout)
+            except asyncio.TimeoutError:
+                await self._reject(send, name, "queue_timeout", 503, "Server busy", limit.queue_timeout)
+                return
+            finally:
+                limit.waiting -= 1
+        else:
+            # Not locked, so this returns without waiting.
+            await limit._semaphore.acquire()
+
+        limit.active += 1
+        self.admitted[name] = self.admitted.get(name, 0) + 1
+        try:
+            await app(scope, receive, send)
+        finally:
+            limit.active -= 1
+            limit._semaphore.release()
+
+    def _client(self, scope):
+        if self.trust_forwarded_for:
+            for key, value in scope["headers"]:
+                if key == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else ""
+
+    def _take_token(self, client):
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.burst, now)
+            if len(self._buckets) > self.max_clients:
+                # Forget the least recently seen client; it comes back with
+                # a full bucket, which is the same as having been idle.
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket.take(self.rate, self.burst, now)
+
+    async def _reject(self, send, name, reason, status, detail, retry_after):
+        key = (name, reason)
+        self.shed[key] = self.shed.get(key, 0) + 1
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    def render(self):
+        lines = [
+            "# HELP admission_admitted_total Requests admitted, by route class.",
+            "# TYPE admission_admitted_total counter",
+        ]
+        lines += [f'admission_admitted_total{{class="{n}"}} {c}' for n, c in sorted(self.admitted.items())]
+        lines += [
+            "# HELP admission_shed_total Requests rejected, by route class and reason.",
+            "# TYPE admission_shed_total counter",
+        ]
+        lines += [
+            f'admission_shed_total{{class="{n}",reason="{r}"}} {c}' for (n, r), c in sorted(self.shed.items())
+        ]
+        lines += [
+            "# HELP admission_active Requests running, by route class.",
+            "# TYPE admission_active gauge",
+        ]
+        lines += [f'admission_active{{class="{n}"}} {l.active}' for n, l in sorted(self.limits.items())]
+        lines += [
+            "# HELP admission_waiting Requests queued, by route class.",
+            "# TYPE admission_waiting gauge",
+        ]
+        lines += [f'admission_waiting{{class="{n}"}} {l.waiting}' for n, l in sorted(self.limits.items())]
+        return lines
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, control):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        await self.control.handle(self.app, scope, receive, send)
@@ -0,0 +1,166 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+
+class CatalogLoadTimeout(Exception):
+    """A caller waited longer than ``load_timeout`` for a catalog load."""
+
+
+class CatalogCache:
+    """Read-through, in-process cache for catalog reads.
+
+    Every entry is tagged with the catalog version it was loaded under. Write
+    paths call ``bump()`` so entries from an older version are never served
+    again. ``tag`` is an opaque identifier of the catalog contents that is
+    the same in every process serving them (``discard`` aside), for use in
+    HTTP validators.
+    Entries also expire after ``ttl`` seconds and the least recently used
+    ones are evicted once ``max_entries`` is reached.
+
+    Concurrent misses for the same key and version share one load (see
+    ``get_or_load``), so a burst of identical reads after a deploy or a seed
+    costs a single database round trip.
+    """
+
+    def __init__(self, ttl=300.0, max_entries=1024, load_timeout=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.load_timeout = load_timeout
+        self.version = 0
+        self.tag = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self._entries = OrderedDict()
+        self._pinned = {}
+        self._inflight = {}
+
+    def bump(self, tag=None, preload=None, keep=None):
+        """Start a new catalog version, optionally already holding ``preload`` entries.
+
+        Preloaded entries are pinned: they neither expire nor count towards
+        ``max_entries``, so readers never find them missing and rebuild
+        them inline. Current entries whose key passes ``keep(key)`` carry
+        over to the new version; use it when a change is known to leave
+        them valid.
+        """
+        kept = [
+            (key, expires_at, value)
+            for key, (version, expires_at, value) in self._entries.items()
+            if keep is not None and version == self.version and keep(key)
+        ]
+        self.version += 1
+        self.tag = tag
+        self._entries.clear()
+        for key, expires_at, value in kept:
+            self._entries[key] = (self.version, expires_at, value)
+        self._pinned = dict(preload or {})
+        return self.version
+
+    def discard(self, predicate):
+        """Drop entries of the current version whose key passes ``predicate(key)``.
+
+        Loads in flight for those keys are not cached when they finish, as
+        they may have read data from before the change that prompted this.
+        Pinned entries are left alone. What this process serves no longer
+        matches ``tag``, so until the next ``bump`` it gets a tag of its own.
+        """
+        if self.tag is not None:
+            self.tag = uuid.uuid4().hex
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+        for inflight in [inflight for inflight in self._inflight if predicate(inflight[0])]:
+            del self._inflight[inflight]
+
+    def pinned(self):
+        """The entries preloaded by the last ``bump``, as a new dict."""
+        return dict(self._pinned)
+
+    def get(self, key, default=None):
+        if key in self._pinned:
+            self.hits += 1
+            return self._pinned[key]
+        entry = self._entries.get(key)
+        if entry is not None:
+            version, expires_at, value = entry
+            if version == self.version and expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def set(self, key, value, version=None):
+        version = self.version if version is None else version
+        if version != self.version:
+            # Loaded under a catalog version that has since been replaced.
+            return
+        self._entries[key] = (version, time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, awaiting ``loader()`` on a miss.
+
+        Only one load per key and catalog version runs at a time; callers
+        that miss while it is in flight wait for it instead of starting
+        their own. The load runs as its own task, so a caller that gives up
+        (``load_timeout``, or a disconnected client) does not cancel it for
+        the others, and its result is still cached when it finishes. An
+        exception raised by the loader is re-raised in every waiting caller
+        and nothing is cached. ``None`` results are not cached either, so
+        lookups of unknown ids keep falling through to the database.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        version = self.version
+        task = self._inflight.get((key, version))
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self._inflight[(key, version)] = task
+            task.add_done_callback(lambda t: self._loaded(key, version, t))
+        else:
+            self.coalesced += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.load_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise CatalogLoadTimeout(key) from None
+
+    def _loaded(self, key, version, task):
+        if self._inflight.get((key, version)) is not task:
+            # Discarded while it was loading.
+            return
+        del self._inflight[(key, version)]
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        if value is not None:
+            self.set(key, value, version=version)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "tag": self.tag,
+            "entries": len(self._entries) + len(self._pinned),
+            "pinned": len(self._pinned),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "inflight": len(self._inflight),
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
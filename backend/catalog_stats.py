@@ -0,0 +1,141 @@
+"""Per-country catalog statistics, materialized as additive counters.
+
+A country's summary is the sum of its places' counters (``place_counters``),
+so a place write updates it with one ``$inc`` of the difference instead of a
+rescan. Mean and max rating are derived when a summary is read: the mean
+from a running sum and count, the max from a count per distinct rating,
+which, unlike a stored maximum, survives deleting the top-rated place.
+
+Rebuild every summary from the catalog (after a bulk load, or to repair
+drift) with:
+
+    python catalog_stats.py
+"""
+import asyncio
+import sys
+
+from facets import MONTHS, PRICE_EDGES, place_facets
+
+
+def _price_labels():
+    labels = [f"{lo}-{hi}" for lo, hi in zip(PRICE_EDGES, PRICE_EDGES[1:])]
+    return labels + [f"{PRICE_EDGES[-1]}+", "unknown"]
+
+PRICE_LABELS = _price_labels()
+
+
+def _price_label(price_min):
+    if price_min is None:
+        return "unknown"
+    for label, hi in zip(PRICE_LABELS, PRICE_EDGES[1:]):
+        if price_min < hi:
+            return label
+    return PRICE_LABELS[-2]
+
+
+def _rating_key(rating):
+    # Field names cannot contain "."; 4.85 is stored under "4_85".
+    return repr(float(rating)).replace(".", "_")
+
+
+def place_counters(place):
+    """One place's contribution to its country's summary, as dotted ``$inc`` paths."""
+    if place is None:
+        return {}
+    facets = place.get("facets") or place_facets(place)
+    counters = {"place_count": 1, f"price.{_price_label(facets['price_min'])}": 1}
+    if place.get("rating") is not None:
+        counters["rated_count"] = 1
+        counters["rating_sum"] = float(place["rating"])
+        counters[f"ratings.{_rating_key(place['rating'])}"] = 1
+    for month, name in enumerate(MONTHS):
+        if facets["months"] >> month & 1:
+            counters[f"months.{name}"] = 1
+    return counters
+
+
+def counters_delta(old, new):
+    """``$inc`` document turning the summary with place ``old`` into one with ``new``.
+
+    Either may be ``None`` for an insert or a delete.
+    """
+    delta = dict(place_counters(new))
+    for path, value in place_counters(old).items():
+        delta[path] = delta.get(path, 0) - value
+    return {path: value for path, value in delta.items() if value}
+
+
+def _add(summary, counters):
+    for path, value in counters.items():
+        name, _, key = path.partition(".")
+        if key:
+            bucket = summary.setdefault(name, {})
+            bucket[key] = bucket.get(key, 0) + value
+        else:
+            summary[name] = summary.get(name, 0) + value
+    return summary
+
+
+def country_summary(country):
+    """The stored summary document for ``country``, built from all its places."""
+    summary = {"_id": country["id"], "place_count": 0}
+    for place in country.get("places", []):
+        _add(summary, place_counters(place))
+    return summary
+
+
+def build(countries):
+    return [country_summary(country) for country in countries]
+
+
+def merge(summaries):
+    """Add stored summaries together, e.g. into a catalog-wide total."""
+    total = {"place_count": 0}
+    for summary in summaries:
+        for name, value in summary.items():
+            if isinstance(value, dict):
+                bucket = total.setdefault(name, {})
+                for key, count in value.items():
+                    bucket[key] = bucket.get(key, 0) + count
+            elif name != "_id":
+                total[name] = total.get(name, 0) + value
+    return total
+
+
+def render(summary):
+    """Turn a stored summary into the API shape."""
+    rated = summary.get("rated_count", 0)
+    ratings = [float(key.replace("_", ".")) for key, count in summary.get("ratings", {}).items() if count > 0]
+    prices = summary.get("price", {})
+    months = summary.get("months", {})
+    season = {name: months.get(name, 0) for name in MONTHS}
+    return {
+        "country_id": summary.get("_id"),
+        "place_count": summary.get("place_count", 0),
+        "rated_count": rated,
+        "mean_rating": round(summary["rating_sum"] / rated, 3) if rated else None,
+        "max_rating": max(ratings) if ratings else None,
+        "price_ranges": {label: prices.get(label, 0) for label in PRICE_LABELS},
+        "season_coverage": season,
+        "months_in_season": sum(1 for count in season.values() if count > 0),
+    }
+
+
+async def rebuild(store):
+    """Recompute every summary from the catalog in ``store``; returns how many were written."""
+    summaries = build(await store.list_countries())
+    await store.replace_stats(summaries)
+    return len(summaries)
+
+
+async def _main():
+    import server
+
+    if server.store.read_only:
+        sys.exit("CATALOG_SNAPSHOT is set; snapshot statistics are computed on load")
+    count = await rebuild(server.store)
+    print(f"rebuilt statistics for {count} countries", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,247 @@
+import gzip
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional at runtime
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def _parse_accept_encoding(value):
+    accepted = {}
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.strip().lower()] = q
+    return accepted
+
+
+class CompressionStats:
+    """Counters shared between the middleware and whatever reports them."""
+
+    def __init__(self):
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.variant_hits = 0
+        self.variant_misses = 0
+
+    def record(self, bytes_in, bytes_out):
+        self.responses += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def snapshot(self):
+        return {
+            "responses": self.responses,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "variant_hits": self.variant_hits,
+            "variant_misses": self.variant_misses,
+        }
+
+
+class CompressionMiddleware:
+    """Content-negotiated gzip/brotli compression.
+
+    Complete responses of at least ``minimum_size`` bytes are compressed.
+    When a GET response carries an ETag, its compressed bytes are kept in a
+    small LRU keyed by path, query, ETag and encoding; an ETag only names a
+    representation of one resource, and only a GET is known to return the
+    same body for it every time. Catalog ETags change with every
+    catalog version, so each variant is compressed once per version and
+    reused afterwards. Streaming responses are compressed chunk by chunk.
+    Compressed responses get a weak ETag, as the body is no longer
+    byte-identical to the identity representation.
+    """
+
+    def __init__(self, app, minimum_size=1024, gzip_level=6, brotli_quality=5,
+                 max_cached_variants=512, stats=None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.max_cached_variants = max_cached_variants
+        self._variants = OrderedDict()
+        self.stats = stats if stats is not None else CompressionStats()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._negotiate(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        resource = (scope["path"], scope["query_string"]) if scope["method"] == "GET" else None
+        await self.app(scope, receive, _Responder(self, encoding, send, resource).send)
+
+    def _negotiate(self, scope):
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accepted = _parse_accept_encoding(value.decode("latin-1"))
+                if brotli is not None and accepted.get("br", 0) > 0:
+                    return "br"
+                if accepted.get("gzip", 0) > 0:
+                    return "gzip"
+                return None
+        return None
+
+    def compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def compress_cached(self, body, encoding, etag, resource=None):
+        if etag is None or resource is None:
+            return self.compress(body, encoding)
+        key = (resource, etag, encoding)
+        compressed = self._variants.get(key)
+        if compressed is not None:
+            self._variants.move_to_end(key)
+            self.stats.variant_hits += 1
+            return compressed
+        self.stats.variant_misses += 1
+        compressed = self.compress(body, encoding)
+        self._variants[key] = compressed
+        if len(self._variants) > self.max_cached_variants:
+            self._variants.popitem(last=False)
+        return compressed
+
+    def streaming_compressor(self, encoding):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.flush, compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return (
+            compressor.compress,
+            lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush,
+        )
+
+
+class _Responder:
+    def __init__(self, middleware, encoding, send, resource=None):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.resource = resource
+        self.start = None
+        self.streaming = None
+        self._pending = None
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            if message["status"] == 304:
+                self.start = self._with_headers(message, weaken_etag=True)
+                await self._send(self.start)
+            return
+        if message["type"] != "http.response.body" or self.start["status"] == 304:
+            await self._send(message)
+            return
+        if self.streaming is None:
+            await self._buffer_body(message)
+        elif self.streaming is False:
+            await self._send(message)
+        else:
+            await self._stream(message)
+
+    def _header(self, name):
+        for key, value in self.start["headers"]:
+            if key == name:
+                return value.decode("latin-1")
+        return None
+
+    def _compressible(self):
+        if self.start["status"] != 200 or self._header(b"content-encoding"):
+            return False
+        content_type = self._header(b"content-type") or ""
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _with_headers(self, message, content_length=None, weaken_etag=False, encoded=False, vary=True):
+        headers = []
+        existing_vary = None
+        for key, value in message["headers"]:
+            if key == b"content-length" and (content_length is not None or encoded):
+                continue
+            if key == b"vary" and vary:
+                existing_vary = value.decode("latin-1")
+                continue
+            if key == b"etag" and weaken_etag and not value.startswith(b"W/"):
+                value = b"W/" + value
+            headers.append((key, value))
+        if encoded:
+            headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode("latin-1")))
+        if vary:
+            value = f"{existing_vary}, Accept-Encoding" if existing_vary else "Accept-Encoding"
+            headers.append((b"vary", value.encode("latin-1")))
+        return dict(message, headers=headers)
+
+    async def _buffer_body(self, message):
+        if self._pending is None:
+            if not self._compressible():
+                self.streaming = False
+                await self._send(self.start)
+                await self._send(message)
+                return
+            self._pending = []
+            self._pending_size = 0
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        self._pending.append(body)
+        self._pending_size += len(body)
+        # Hold small chunks back until we know whether the body reaches the
+        # size threshold; a complete body is compressed (or not) in one go.
+        if more_body and self._pending_size < self.middleware.minimum_size:
+            return
+        body = b"".join(self._pending)
+        self._pending = None
+
+        if not more_body:
+            self.streaming = False
+            if len(body) < self.middleware.minimum_size:
+                await self._send(self._with_headers(self.start, content_length=len(body), vary=False))
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            compressed = self.middleware.compress_cached(
+                body, self.encoding, self._header(b"etag"), self.resource
+            )
+            self.middleware.stats.record(len(body), len(compressed))
+            await self._send(self._with_headers(
+                self.start, content_length=len(compressed), weaken_etag=True, encoded=True
+            ))
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+
+        self.streaming = True
+        self._compress, self._flush, self._finish = self.middleware.streaming_compressor(self.encoding)
+        self._bytes_in = self._bytes_out = 0
+        await self._send(self._with_headers(self.start, weaken_etag=True, encoded=True))
+        await self._stream({"type": "http.response.body", "body": body, "more_body": True})
+
+    async def _stream(self, message):
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        chunk = self._compress(body) if body else b""
+        # Flush every chunk so streamed records reach the client promptly.
+        chunk += self._flush() if more_body else self._finish()
+        self._bytes_in += len(body)
+        self._bytes_out += len(chunk)
+        if not more_body:
+            self.middleware.stats.record(self._bytes_in, self._bytes_out)
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,92 @@
+import functools
+import hashlib
+
+
+@functools.lru_cache(maxsize=4096)
+def catalog_etag(tag, path, query, accept):
+    digest = hashlib.sha1(f"{path}?{query}|{accept}".encode("utf-8")).hexdigest()[:16]
+    return f'"{tag[:16]}-{digest}"'
+
+
+def _candidates(if_none_match):
+    return [c.strip() for c in if_none_match.split(",")] if if_none_match else []
+
+
+def etag_matches(if_none_match, etag, exists=False):
+    """Whether ``If-None-Match`` matches ``etag``.
+
+    ``*`` matches any current representation, so it only counts when the
+    caller knows the resource ``exists``.
+    """
+    candidates = _candidates(if_none_match)
+    return (exists and "*" in candidates) or etag in candidates or f"W/{etag}" in candidates
+
+
+class ConditionalGetMiddleware:
+    """ETag / If-None-Match / Cache-Control for catalog GET routes.
+
+    The validator comes from the catalog tag (``tag_getter()``) and the
+    request alone. A revalidation that matches is answered with a 304 before
+    the route runs, so it costs no database or serialization work. ``*``
+    cannot be checked up front: the route runs, and a 200 from it becomes
+    the 304. Routes
+    under ``prefixes`` must depend only on the catalog contents and the URL;
+    paths matching the ``exclude`` regex are passed through untouched, for
+    routes under a prefix that set validators of their own.
+    """
+
+    def __init__(self, app, tag_getter, prefixes, cache_control, exclude=None):
+        self.app = app
+        self.tag_getter = tag_getter
+        self.prefixes = tuple(prefixes)
+        self.cache_control = cache_control.encode("latin-1")
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        tag = self.tag_getter() if scope["type"] == "http" else None
+        if (tag is None or scope["method"] not in ("GET", "HEAD")
+                or not scope["path"].startswith(self.prefixes)
+                or (self.exclude is not None and self.exclude.match(scope["path"]))):
+            await self.app(scope, receive, send)
+            return
+
+        accept = if_none_match = ""
+        for name, value in scope["headers"]:
+            if name == b"accept":
+                accept = value.decode("latin-1")
+            elif name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+        etag = catalog_etag(tag, scope["path"], scope["query_string"].decode("latin-1"), accept)
+        validators = [
+            (b"etag", etag.encode("latin-1")),
+            (b"cache-control", self.cache_control),
+        ]
+
+        if etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": validators + [(b"vary", b"Accept")]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        wildcard = "*" in _candidates(if_none_match)
+        not_modified = False
+
+        async def send_with_validators(message):
+            nonlocal not_modified
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                vary = [v.decode("latin-1") for k, v in message["headers"] if k == b"vary"]
+                vary = ", ".join(vary + ["Accept"])
+                if wildcard:
+                    not_modified = True
+                    await send({"type": "http.response.start", "status": 304,
+                                "headers": validators + [(b"vary", vary.encode("latin-1"))]})
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+                headers = [(k, v) for k, v in message["headers"] if k not in (b"etag", b"cache-control", b"vary")]
+                message = dict(message, headers=headers + validators + [(b"vary", vary.encode("latin-1"))])
+            elif not_modified:
+                # The route's body is dropped; the 304 went out already.
+                return
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
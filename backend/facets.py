@@ -0,0 +1,152 @@
+import re
+
+import numpy as np
+
+
+MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+ALL_MONTHS = (1 << 12) - 1
+
+# Price histogram edges (USD, on the low end of a place's range).
+PRICE_EDGES = (0, 1000, 2000, 3000, 4000, 5000)
+# Cumulative thresholds, matching the min_rating and max_days filters.
+RATING_THRESHOLDS = (4.0, 4.5, 4.7, 4.8, 4.9)
+DAY_THRESHOLDS = (1, 2, 3, 4, 5, 7)
+
+_NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+_MONTH_RE = re.compile(r"\b(" + "|".join(MONTHS) + r")[a-z]*", re.IGNORECASE)
+
+
+def parse_price(text):
+    """``"$1,200 - $2,000"`` -> ``(1200.0, 2000.0)``; ``(None, None)`` if there is no number."""
+    numbers = [float(n.replace(",", "")) for n in _NUMBER_RE.findall(text or "")]
+    if not numbers:
+        return None, None
+    return min(numbers), max(numbers)
+
+
+def parse_duration(text):
+    """``"3-4 days"`` -> ``(3, 4)``, ``"2 weeks"`` -> ``(14, 14)``."""
+    text = (text or "").lower()
+    numbers = [float(n.replace(",", "")) for n in _NUMBER_RE.findall(text)]
+    if not numbers:
+        return None, None
+    scale = 7 if "week" in text else 1
+    return min(numbers) * scale, max(numbers) * scale
+
+
+def parse_months(text):
+    """``"March to May, October"`` -> 12-bit mask with bit 0 for January.
+
+    Ranges wrap around the year end, so ``"December to February"`` covers
+    three months. Unparseable text gives 0.
+    """
+    text = (text or "").lower()
+    if ("year" in text and "round" in text) or "all year" in text:
+        return ALL_MONTHS
+    mask = 0
+    for part in re.split(r"[,;&]|\band\b", text):
+        months = [MONTHS.index(m[:3]) for m in _MONTH_RE.findall(part)]
+        if not months:
+            continue
+        if len(months) == 1 or not re.search(r"\bto\b|-|–|through|until", part):
+            for m in months:
+                mask |= 1 << m
+            continue
+        start, end = months[0], months[-1]
+        m = start
+        while True:
+            mask |= 1 << m
+            if m == end:
+                break
+            m = (m + 1) % 12
+    return mask
+
+
+def place_facets(place):
+    """Normalized filter fields for a place, parsed from its free-text fields."""
+    price_min, price_max = parse_price(place.get("price"))
+    days_min, days_max = parse_duration(place.get("duration"))
+    return {
+        "price_min": price_min,
+        "price_max": price_max,
+        "days_min": days_min,
+        "days_max": days_max,
+        "months": parse_months(place.get("best_time")),
+    }
+
+
+def normalize_catalog(countries):
+    """Attach ``facets`` to every place, in place. Run once at ingest time."""
+    for country in countries:
+        for place in country.get("places", []):
+            place["facets"] = place_facets(place)
+    return countries
+
+
+def _column(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+class FacetArrays:
+    """Column arrays over every place, for vectorized filtering and counting."""
+
+    COLUMNS = ("price_min", "price_max", "days_min", "rating", "months")
+
+    def __init__(self, rows):
+        """``rows`` is a list of ``(country_id, place)`` pairs."""
+        self.rows = rows
+        facets = [place.get("facets") or place_facets(place) for _, place in rows]
+        self.price_min = _column(f["price_min"] for f in facets)
+        self.price_max = _column(f["price_max"] for f in facets)
+        self.days_min = _column(f["days_min"] for f in facets)
+        self.rating = _column(place.get("rating") for _, place in rows)
+        self.months = np.array([f["months"] for f in facets], dtype=np.uint16)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def spliced(self, start, end, rows):
+        """A copy with ``self.rows[start:end]`` replaced by ``rows``, parsing only those."""
+        middle = FacetArrays(list(rows))
+        arrays = FacetArrays.__new__(FacetArrays)
+        arrays.rows = self.rows[:start] + middle.rows + self.rows[end:]
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            setattr(arrays, name, np.concatenate((column[:start], getattr(middle, name), column[end:])))
+        return arrays
+
+    def filter(self, min_price=None, max_price=None, min_rating=None, month=None, max_days=None):
+        """Return the indices of places matching every given filter.
+
+        Price filters match places whose price range overlaps
+        ``[min_price, max_price]``. Places with unparsed values never match
+        a filter on that field.
+        """
+        mask = np.ones(len(self.rows), dtype=bool)
+        if min_price is not None:
+            mask &= self.price_max >= min_price
+        if max_price is not None:
+            mask &= self.price_min <= max_price
+        if min_rating is not None:
+            mask &= self.rating >= min_rating
+        if month is not None:
+            mask &= (self.months & (1 << (month - 1))) != 0
+        if max_days is not None:
+            mask &= self.days_min <= max_days
+        return np.flatnonzero(mask)
+
+    def counts(self, idx):
+        price = self.price_min[idx]
+        price = price[~np.isnan(price)]
+        hist = np.histogram(price, bins=list(PRICE_EDGES) + [np.inf])[0]
+        labels = [f"{lo}-{hi}" for lo, hi in zip(PRICE_EDGES, PRICE_EDGES[1:])] + [f"{PRICE_EDGES[-1]}+"]
+
+        rating = self.rating[idx]
+        days = self.days_min[idx]
+        months = self.months[idx]
+        return {
+            "price": dict(zip(labels, hist.tolist())),
+            "min_rating": {str(t): int(np.count_nonzero(rating >= t)) for t in RATING_THRESHOLDS},
+            "max_days": {str(t): int(np.count_nonzero(days <= t)) for t in DAY_THRESHOLDS},
+            "month": {str(m + 1): int(np.count_nonzero(months & (1 << m))) for m in range(12)},
+        }
@@ -0,0 +1,115 @@
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distance in km from one point (radians) to arrays of points (radians)."""
+    dlat = lats - lat
+    dlng = lngs - lng
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GeoIndex:
+    """Fixed-size lat/lng grid over place coordinates.
+
+    Points are sorted by grid cell so each occupied cell is one contiguous
+    slice of the coordinate arrays. A query only looks at the cells that
+    overlap the search radius and computes exact distances for those
+    candidates in one vectorized pass.
+    """
+
+    def __init__(self, items, cell_deg=1.0):
+        """``items`` is an iterable of ``(lat, lng, payload)`` tuples in degrees."""
+        self.cell_deg = cell_deg
+        self._n_cols = int(np.ceil(360.0 / cell_deg))
+        self._install(*self._points(items))
+
+    def _points(self, items):
+        """Cell ids, coordinates in radians and payloads of ``items``."""
+        items = list(items)
+        lats = np.array([lat for lat, _, _ in items], dtype=np.float64)
+        lngs = np.array([lng for _, lng, _ in items], dtype=np.float64)
+        rows = np.floor((lats + 90.0) / self.cell_deg).astype(np.int64)
+        cols = np.floor((lngs + 180.0) / self.cell_deg).astype(np.int64) % self._n_cols
+        return rows * self._n_cols + cols, np.radians(lats), np.radians(lngs), [payload for _, _, payload in items]
+
+    def _install(self, cells, lats, lngs, payloads):
+        order = np.argsort(cells, kind="stable")
+        self._lats = lats[order]
+        self._lngs = lngs[order]
+        self._payloads = [payloads[i] for i in order]
+        self._cell_ids = cells[order]
+
+        unique, starts = np.unique(self._cell_ids, return_index=True)
+        ends = np.append(starts[1:], len(self._cell_ids))
+        self._cells = {int(c): (int(s), int(e)) for c, s, e in zip(unique, starts, ends)}
+
+    def spliced(self, drop, items):
+        """A copy without the points whose payload passes ``drop(payload)``, plus ``items``.
+
+        Kept points are not re-projected, only re-sorted with the new ones.
+        """
+        keep = np.flatnonzero([not drop(payload) for payload in self._payloads])
+        cells, lats, lngs, payloads = self._points(items)
+        index = GeoIndex.__new__(GeoIndex)
+        index.cell_deg, index._n_cols = self.cell_deg, self._n_cols
+        index._install(
+            np.concatenate((self._cell_ids[keep], cells)),
+            np.concatenate((self._lats[keep], lats)),
+            np.concatenate((self._lngs[keep], lngs)),
+            [self._payloads[i] for i in keep] + payloads,
+        )
+        return index
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def _candidate_slices(self, lat, lng, radius_km):
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        row_lo = int(np.floor((max(lat - dlat, -90.0) + 90.0) / self.cell_deg))
+        row_hi = int(np.floor((min(lat + dlat, 90.0) + 90.0) / self.cell_deg))
+
+        max_abs_lat = min(abs(lat) + dlat, 90.0)
+        if max_abs_lat >= 89.9:
+            cols = None
+        else:
+            dlng = np.degrees(radius_km / (EARTH_RADIUS_KM * np.cos(np.radians(max_abs_lat))))
+            if dlng >= 180.0:
+                cols = None
+            else:
+                col_lo = int(np.floor((lng - dlng + 180.0) / self.cell_deg))
+                col_hi = int(np.floor((lng + dlng + 180.0) / self.cell_deg))
+                cols = {c % self._n_cols for c in range(col_lo, col_hi + 1)}
+
+        n_cells = (row_hi - row_lo + 1) * (len(cols) if cols is not None else self._n_cols)
+        if n_cells > len(self._cells):
+            # Wide searches: walking the occupied cells is cheaper than
+            # probing every cell in the window.
+            for cell, span in self._cells.items():
+                row, col = divmod(cell, self._n_cols)
+                if row_lo <= row <= row_hi and (cols is None or col in cols):
+                    yield span
+            return
+        for row in range(row_lo, row_hi + 1):
+            for col in (cols if cols is not None else range(self._n_cols)):
+                span = self._cells.get(row * self._n_cols + col)
+                if span is not None:
+                    yield span
+
+    def nearest(self, lat, lng, radius_km, k):
+        """Return up to ``k`` ``(payload, distance_km)`` pairs within ``radius_km``, nearest first."""
+        spans = list(self._candidate_slices(lat, lng, radius_km))
+        if not spans:
+            return []
+        idx = np.concatenate([np.arange(s, e) for s, e in spans])
+        dist = haversine_km(np.radians(lat), np.radians(lng), self._lats[idx], self._lngs[idx])
+        within = dist <= radius_km
+        idx, dist = idx[within], dist[within]
+        if len(idx) > k:
+            top = np.argpartition(dist, k - 1)[:k]
+            idx, dist = idx[top], dist[top]
+        order = np.argsort(dist, kind="stable")
+        return [(self._payloads[i], float(d)) for i, d in zip(idx[order], dist[order])]
@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is optional at runtime
+    Image = None
+
+RESIZE_AVAILABLE = Image is not None
+
+
+# Requested widths are rounded up to one of these, so the cache holds a
+# handful of variants per image instead of one per distinct ?w=.
+WIDTH_BUCKETS = (160, 320, 480, 640, 960, 1280, 1920)
+
+MEDIA_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+class ImageFetchError(Exception):
+    """The origin image could not be fetched or decoded."""
+
+
+def bucket_width(width):
+    for bucket in WIDTH_BUCKETS:
+        if width <= bucket:
+            return bucket
+    return WIDTH_BUCKETS[-1]
+
+
+class UrlFetcher:
+    """Fetch origin images over HTTPS with ``requests`` on a worker thread.
+
+    Catalog URLs are client-writable, so only hosts in ``allowed_hosts``
+    are fetched; an entry starting with ``.`` also allows its subdomains.
+    Redirects are not followed, as they could lead anywhere.
+
+    Any ``async (url) -> bytes`` callable can stand in for this, e.g. one
+    that reads fixtures from disk.
+    """
+
+    def __init__(self, allowed_hosts=(), timeout=10.0, max_bytes=20 * 2 ** 20, schemes=("https",)):
+        self.allowed_hosts = tuple(host.strip().lower() for host in allowed_hosts if host.strip())
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.schemes = schemes
+
+    def allows(self, url):
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        if parts.scheme not in self.schemes or not host:
+            return False
+        return any(
+            host == allowed or (allowed.startswith(".") and host.endswith(allowed))
+            for allowed in self.allowed_hosts
+        )
+
+    def _get(self, url):
+        import requests
+
+        if not self.allows(url):
+            raise ImageFetchError(f"{url}: origin not allowed")
+        try:
+            with requests.get(url, timeout=self.timeout, stream=True, allow_redirects=False) as response:
+                if response.is_redirect:
+                    raise ImageFetchError(f"{url}: redirects are not followed")
+                response.raise_for_status()
+                body = response.raw.read(self.max_bytes + 1, decode_content=True)
+        except requests.RequestException as exc:
+            raise ImageFetchError(f"{url}: {exc}") from exc
+        if len(body) > self.max_bytes:
+            raise ImageFetchError(f"{url}: larger than {self.max_bytes} bytes")
+        return body
+
+    async def __call__(self, url):
+        return await asyncio.to_thread(self._get, url)
+
+
+class DiskCache:
+    """Size-bounded LRU of files in one directory.
+
+    The in-memory index is rebuilt from file mtimes on start, and hits
+    touch the file, so recency survives restarts. Writes go through a
+    temporary file and a rename, so readers never see a partial file.
+    Methods are blocking but thread-safe, so callers on an event loop run
+    them in a thread.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self.size += size
+        self._evict()
+
+    def __len__(self):
+        return len(self._index)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._index:
+                return None
+        try:
+            with open(self._path(name), "rb") as fh:
+                data = fh.read()
+            os.utime(self._path(name))
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._index.pop(name, 0)
+            return None
+        with self._lock:
+            if name in self._index:
+                self._index.move_to_end(name)
+        return data
+
+    def put(self, name, data):
+        tmp = self._path(f"{name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, self._path(name))
+        with self._lock:
+            self.size += len(data) - self._index.pop(name, 0)
+            self._index[name] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(name))
+            except FileNotFoundError:
+                pass
+
+
+def _resize(data, width, fmt, quality):
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # Let the JPEG decoder downscale while decoding when it can.
+            img.draft("RGB", (width, width * 4))
+            img = ImageOps.exif_transpose(img)
+            if img.width > width:
+                img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+            if img.mode not in ("RGB", "RGBA") or (fmt == "jpeg" and img.mode != "RGB"):
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            if fmt == "webp":
+                img.save(out, "WEBP", quality=quality, method=4)
+            else:
+                img.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+            return out.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise ImageFetchError(f"cannot decode image: {exc}") from exc
+
+
+class ImageProxy:
+    """Width-bucketed thumbnails of origin images, cached on disk.
+
+    The origin is fetched once per URL and kept in the same cache as its
+    thumbnails. Resizing runs in a thread pool; Pillow releases the GIL
+    while decoding, resampling and encoding. Concurrent requests for the
+    same variant share one fetch and one resize.
+    """
+
+    def __init__(self, fetcher, cache, workers=2, quality=80):
+        self.fetcher = fetcher
+        self.cache = cache
+        self.quality = quality
+        self.hits = 0
+        self.misses = 0
+        self.origin_fetches = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self._inflight = {}
+
+    @staticmethod
+    def variant_name(url, width, fmt):
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return f"{digest}-{width}.{fmt}"
+
+    async def thumbnail(self, url, width, fmt):
+        """Return the bytes of ``url`` resized to the ``width`` bucket in ``fmt``."""
+        name = self.variant_name(url, width, fmt)
+        data = await asyncio.to_thread(self.cache.get, name)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+        return await self._once(name, lambda: self._render(name, url, width, fmt))
+
+    async def _once(self, name, make):
+        task = self._inflight.get(name)
+        if task is None:
+            task = asyncio.ensure_future(make())
+            self._inflight[name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(name, None))
+        return await asyncio.shield(task)
+
+    async def _origin(self, url):
+        name = self.variant_name(url, 0, "orig")
+        data = await asyncio.to_thread(self.cache.get, name)
+        if data is None:
+            async def fetch():
+                self.origin_fetches += 1
+                body = await self.fetcher(url)
+                await asyncio.to_thread(self.cache.put, name, body)
+                return body
+            data = await self._once(name, fetch)
+        return data
+
+    async def _render(self, name, url, width, fmt):
+        origin = await self._origin(url)
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self._pool, _resize, origin, width, fmt, self.quality)
+        await asyncio.to_thread(self.cache.put, name, data)
+        return data
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "origin_fetches": self.origin_fetches,
+            "cache_bytes": self.cache.size,
+            "cache_files": len(self.cache),
+            "evictions": self.cache.evictions,
+        }
+
+    def close(self):
+        self._pool.shutdown(wait=False)
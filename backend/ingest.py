@@ -0,0 +1,302 @@
+"""Stream a large catalog file into MongoDB.
+
+    python ingest.py catalog.jsonl [--batch-size 1000] [--concurrency 4] [--resume]
+
+Input is JSONL or CSV, chosen by file extension or ``--format``.
+
+* JSONL lines are either country documents (``hero_image``, optionally
+  ``places``) or place rows carrying a ``country_id``.
+* CSV rows are place rows with the ``Place`` columns plus ``country_id``,
+  ``lat`` and ``lng``.
+
+Rows are validated against the ``Place``/``Country`` models in batches and
+written with unordered ``bulk_write`` upserts, with at most ``--concurrency``
+batches in flight. Rows that fail validation, and places whose id another
+country already holds, go to ``<input>.rejects.jsonl``. Progress is
+checkpointed to ``<input>.checkpoint``, so ``--resume`` skips lines that are
+already committed. Replaying a line is harmless because every write is an
+upsert.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+import catalog_stats
+from facets import place_facets
+from server import Country, Place, db, store
+
+# Server error code for a unique index violation.
+DUPLICATE_KEY = 11000
+
+
+class Checkpoint:
+    """Highest input line number below which every batch is committed."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.line = 0
+        self._done = {}
+
+    def load(self):
+        if self.path.exists():
+            self.line = json.loads(self.path.read_text())["line"]
+        return self.line
+
+    def complete(self, first_line, last_line):
+        # Batches can finish out of order; only advance over a contiguous run.
+        self._done[first_line] = last_line
+        while self.line + 1 in self._done:
+            self.line = self._done.pop(self.line + 1)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"line": self.line}))
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+def read_rows(path, fmt, skip):
+    """Yield ``(line_number, row)`` for every input line after ``skip``.
+
+    CSV rows are dicts; JSONL rows are the raw line, decoded by the caller so
+    a malformed line is rejected rather than aborting the run.
+    """
+    with open(path, newline="", encoding="utf-8") as fh:
+        if fmt == "csv":
+            # Data rows start on line 2; numbering them from 1 keeps
+            # checkpoints independent of the header.
+            for number, row in enumerate(csv.DictReader(fh), start=1):
+                if number > skip:
+                    yield number, row
+            return
+        for number, line in enumerate(fh, start=1):
+            if number > skip and line.strip():
+                yield number, line
+
+
+def _place_from_row(row):
+    row = dict(row)
+    if "location" not in row:
+        row["location"] = {"lat": float(row.pop("lat")), "lng": float(row.pop("lng"))}
+    place = Place.model_validate(row).model_dump()
+    place["facets"] = place_facets(place)
+    return place
+
+
+def place_operations(country_id, place):
+    """``(update, insert)`` pair that upserts ``place`` into its country's places.
+
+    The update matches only if the country already has the place, the
+    insert only if it does not; sent in that order, exactly one applies.
+    Replacing a place bumps its revision, as a write through the API does,
+    so If-Match clients holding the old one get a 412.
+    """
+    fields = {f"places.$.{name}": value for name, value in place.items() if name != "rev"}
+    return (
+        UpdateOne({"id": country_id, "places.id": place["id"]}, {"$set": fields, "$inc": {"places.$.rev": 1}}),
+        UpdateOne({"id": country_id, "places.id": {"$ne": place["id"]}}, {"$push": {"places": dict(place, rev=0)}}),
+    )
+
+
+def to_operations(row):
+    """Validate one row and return ``(country operations, place pairs)``.
+
+    Place pairs come from ``place_operations``; a country row with
+    ``places`` is split into one per place, so revisions of places it
+    already had carry on.
+    """
+    if "hero_image" in row:
+        country = Country.model_validate({"places": [], **row}).model_dump()
+        # Country metadata; places come from the pairs or from other rows.
+        fields = {k: v for k, v in country.items() if k != "places"}
+        ops = [UpdateOne({"id": country["id"]}, {"$set": fields, "$setOnInsert": {"places": []}}, upsert=True)]
+        if "places" not in row:
+            return ops, []
+        ids = [place["id"] for place in country["places"]]
+        # The row lists all of the country's places: drop the others.
+        ops.append(UpdateOne({"id": country["id"]}, {"$pull": {"places": {"id": {"$nin": ids}}}}))
+        for place in country["places"]:
+            place["facets"] = place_facets(place)
+        return ops, [place_operations(country["id"], place) for place in country["places"]]
+
+    country_id = row.get("country_id")
+    if not country_id:
+        raise ValueError("place row has no country_id")
+    place = _place_from_row({k: v for k, v in row.items() if k != "country_id"})
+    return [], [place_operations(country_id, place)]
+
+
+class Ingest:
+    def __init__(self, path, fmt, batch_size, concurrency, resume):
+        self.path = path
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.checkpoint = Checkpoint(f"{path}.checkpoint")
+        self.rejects_path = f"{path}.rejects.jsonl"
+        self.resume = resume
+        self.rows = self.written = self.rejected = self.unmatched = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+        self._pending = set()
+        self._rejects = None
+
+    def _reject(self, number, error, row):
+        self.rejected += 1
+        self._rejects.write(json.dumps({"line": number, "error": error, "row": row}, default=str) + "\n")
+
+    async def _write(self, first_line, last_line, country_ops, place_pairs, sources):
+        try:
+            # Countries go first so places in the same batch find their parent.
+            if country_ops:
+                await db.countries.bulk_write(country_ops, ordered=False)
+            if place_pairs:
+                # All updates before any insert, so a place the batch
+                # inserts is not then updated as well.
+                updates = await db.countries.bulk_write([update for update, _ in place_pairs], ordered=False)
+                inserted, duplicates = await self._insert_places([insert for _, insert in place_pairs])
+                for index in duplicates:
+                    number, row = sources[index]
+                    self._reject(number, "place id already exists in another country", row)
+                self.unmatched += len(place_pairs) - updates.matched_count - inserted - len(duplicates)
+            self.written += last_line - first_line + 1
+            self.checkpoint.complete(first_line, last_line)
+        finally:
+            self.semaphore.release()
+        self._report()
+
+    async def _insert_places(self, inserts):
+        """Run the insert half of the place pairs; returns ``(matched, indexes of duplicate ids)``."""
+        try:
+            return (await db.countries.bulk_write(inserts, ordered=False)).matched_count, []
+        except BulkWriteError as exc:
+            # A place id taken by another country violates the unique index
+            # on places.id. That row is rejected; anything else stops the run.
+            errors = exc.details["writeErrors"]
+            if any(error["code"] != DUPLICATE_KEY for error in errors):
+                raise
+            return exc.details.get("nMatched", 0), [error["index"] for error in errors]
+
+    def _report(self, final=False):
+        now = time.monotonic()
+        if not final and now - self._last_report < 5:
+            return
+        self._last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        print(f"{'done' if final else 'progress'}: {self.rows} rows read, {self.written} lines committed, "
+              f"{self.rejected} rejected, {self.unmatched} places without a country, "
+              f"{self.rows / elapsed:,.0f} rows/s", file=sys.stderr)
+
+    async def run(self):
+        skip = self.checkpoint.load() if self.resume else 0
+        if not self.resume:
+            self.checkpoint.clear()
+        if skip:
+            print(f"resuming after line {skip}", file=sys.stderr)
+
+        with open(self.rejects_path, "a" if self.resume else "w", encoding="utf-8") as self._rejects:
+            try:
+                await self._ingest(skip)
+            except BaseException:
+                # Let batches already sent finish so the checkpoint covers all
+                # that was committed, then stop: the checkpoint stays for
+                # --resume and the catalog is not marked changed.
+                await asyncio.gather(*self._pending, return_exceptions=True)
+                raise
+
+        if self.written:
+            # Bulk upserts don't carry the replaced places, so the summaries
+            # are rebuilt rather than adjusted.
+            await catalog_stats.rebuild(store)
+            await mark_catalog_changed()
+        self.checkpoint.clear()
+        self._report(final=True)
+        return self.rejected == 0
+
+    async def _ingest(self, skip):
+        # Batches cover contiguous line ranges, including rejected and blank
+        # lines, so the checkpoint can advance over them.
+        first_line, last_line = skip + 1, skip
+        country_ops, place_pairs, sources = [], [], []
+        for number, row in read_rows(self.path, self.fmt, skip):
+            self.rows += 1
+            last_line = number
+            try:
+                if isinstance(row, str):
+                    row = json.loads(row)
+                ops, pairs = to_operations(row)
+            except (ValidationError, ValueError, TypeError, KeyError) as exc:
+                self._reject(number, str(exc), row)
+                continue
+            country_ops.extend(ops)
+            place_pairs.extend(pairs)
+            sources.extend([(number, row)] * len(pairs))
+            if len(country_ops) + len(place_pairs) >= self.batch_size:
+                await self._flush(first_line, last_line, country_ops, place_pairs, sources)
+                first_line, country_ops, place_pairs, sources = last_line + 1, [], [], []
+        if last_line >= first_line:
+            await self._flush(first_line, last_line, country_ops, place_pairs, sources)
+        await asyncio.gather(*self._pending)
+
+    async def _flush(self, first_line, last_line, country_ops, place_pairs, sources):
+        await self.semaphore.acquire()
+        # A failed batch stops the run at the next flush instead of being
+        # dropped with the finished tasks.
+        for task in [t for t in self._pending if t.done()]:
+            self._pending.discard(task)
+            task.result()
+        task = asyncio.ensure_future(self._write(first_line, last_line, country_ops, place_pairs, sources))
+        self._pending.add(task)
+        if country_ops:
+            # Later batches may hold places for these countries; let the
+            # country upserts land before anything else is sent.
+            await task
+
+
+async def mark_catalog_changed():
+    """Give the catalog a new tag and version and flag it so /api/seed won't overwrite it.
+
+    Running API workers notice the new tag within CATALOG_REFRESH_INTERVAL.
+    """
+    await store.update_meta({
+        "seed_hash": None,
+        "tag": uuid.uuid4().hex,
+        "source": "ingest",
+        "change": None,
+        "updated_at": datetime.now(timezone.utc)
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a JSONL/CSV catalog into MongoDB.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["jsonl", "csv"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--resume", action="store_true", help="skip lines committed by a previous run")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    ingest = Ingest(args.path, fmt, args.batch_size, args.concurrency, args.resume)
+    try:
+        ok = asyncio.run(ingest.run())
+    except PyMongoError as exc:
+        print(f"failed: {exc}; committed lines are checkpointed, rerun with --resume", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
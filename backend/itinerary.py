@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+
+from geo_index import haversine_km
+
+
+def distance_matrix(lats, lngs):
+    """Pairwise great-circle distances in km for points given in degrees."""
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lngs = np.radians(np.asarray(lngs, dtype=np.float64))
+    return haversine_km(lats[:, None], lngs[:, None], lats[None, :], lngs[None, :])
+
+
+def nearest_neighbour(dist, start=0):
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    order = [start]
+    visited[start] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[order[-1]])
+        nxt = int(np.argmin(row))
+        order.append(nxt)
+        visited[nxt] = True
+    return order
+
+
+def two_opt(path, dist, deadline, closed=False):
+    """Improve ``path`` by segment reversals until none helps or ``deadline`` passes.
+
+    ``path[0]`` stays first. A closed path ends with ``path[0]`` again,
+    which also stays put. For each segment start, every segment end is
+    scored in one vectorized pass and the best reversal is applied.
+    Returns ``(path, finished)``; ``finished`` is False when time ran out.
+    """
+    path = np.array(path)
+    m = len(path)
+    last = m - 2 if closed else m - 1
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, last):
+            if time.monotonic() > deadline:
+                return path.tolist(), False
+            a, b = path[i - 1], path[i]
+            js = np.arange(i + 1, last + 1)
+            c = path[js]
+            delta = dist[a, c] - dist[a, b]
+            has_next = js + 1 < m
+            nxt = path[np.minimum(js + 1, m - 1)]
+            delta += np.where(has_next, dist[b, nxt] - dist[c, nxt], 0.0)
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                j = int(js[best])
+                path[i:j + 1] = path[i:j + 1][::-1].copy()
+                improved = True
+    return path.tolist(), True
+
+
+def plan_route(lats, lngs, start=0, round_trip=False, time_limit=0.5):
+    """Order points into a short route starting at index ``start``.
+
+    Nearest-neighbour gives the initial route and 2-opt improves it until
+    it converges or ``time_limit`` seconds have passed. Returns
+    ``(order, leg_km, optimized)`` where ``leg_km[k]`` is the distance from
+    stop ``k - 1`` to stop ``k`` (0 for the first stop, and a final return
+    leg appended for round trips).
+    """
+    deadline = time.monotonic() + time_limit
+    dist = distance_matrix(lats, lngs)
+    path = nearest_neighbour(dist, start)
+    if round_trip:
+        path.append(start)
+    path, optimized = two_opt(path, dist, deadline, closed=round_trip)
+    legs = [0.0] + [float(dist[a, b]) for a, b in zip(path, path[1:])]
+    if round_trip:
+        path = path[:-1]
+    return path, legs, optimized
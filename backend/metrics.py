@@ -0,0 +1,230 @@
+import bisect
+import threading
+import time
+from collections.abc import Mapping
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+
+# Upper bounds in seconds, shared by request and database histograms.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f"{name}_bucket{{{labels},le=\"{bound}\"}} {cumulative}"
+        yield f"{name}_bucket{{{labels},le=\"+Inf\"}} {self.count}"
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestMetrics:
+    """Per-route request latency and status counts."""
+
+    def __init__(self):
+        self.latency = {}
+        self.responses = {}
+
+    def record(self, method, route, status, seconds):
+        key = (method, route)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram()
+        histogram.observe(seconds)
+        key = (method, route, status)
+        self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(self):
+        lines = [
+            "# HELP http_request_duration_seconds Time from request start to the last body byte.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            lines.extend(histogram.samples(
+                "http_request_duration_seconds",
+                f'method="{method}",route="{_label_value(route)}"',
+            ))
+        lines += [
+            "# HELP http_responses_total Responses by route and status code.",
+            "# TYPE http_responses_total counter",
+        ]
+        for (method, route, status), count in sorted(self.responses.items()):
+            lines.append(
+                f'http_responses_total{{method="{method}",route="{_label_value(route)}",status="{status}"}} {count}'
+            )
+        return lines
+
+
+class RequestTimingMiddleware:
+    """Times every HTTP request and records it under its route template.
+
+    Routes are labelled by their path template (``/api/places/{place_id}``),
+    so label cardinality stays bounded. Requests answered before routing
+    (e.g. a 304 from ConditionalGetMiddleware) are matched against
+    ``routes``; anything that matches no route is labelled ``unmatched``.
+    """
+
+    def __init__(self, app, metrics, routes=()):
+        self.app = app
+        self.metrics = metrics
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.record(scope["method"], self._route(scope), status, time.perf_counter() - start)
+
+    def _route(self, scope):
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """PyMongo command listener: latency and documents returned per collection.
+
+    Motor runs commands on its own threads, so state is guarded by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.latency = {}
+        self.documents = {}
+        self.failures = {}
+
+    def started(self, event):
+        command = event.command
+        name = event.command_name
+        if name == "getMore":
+            collection = command.get("collection")
+        else:
+            collection = command.get(name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (event.database_name, collection)
+
+    def _finish(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        target = self._finish(event)
+        if target is None:
+            return
+        key = target + (event.command_name,)
+        cursor = event.reply.get("cursor") if isinstance(event.reply, Mapping) else None
+        returned = 0
+        if isinstance(cursor, Mapping):
+            returned = len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+        with self._lock:
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram()
+            histogram.observe(event.duration_micros / 1e6)
+            if returned:
+                self.documents[key] = self.documents.get(key, 0) + returned
+
+    def failed(self, event):
+        target = self._finish(event)
+        if target is None:
+            return
+        key = target + (event.command_name,)
+        with self._lock:
+            self.failures[key] = self.failures.get(key, 0) + 1
+
+    def render(self):
+        with self._lock:
+            latency = sorted(self.latency.items())
+            documents = sorted(self.documents.items())
+            failures = sorted(self.failures.items())
+            lines = [
+                "# HELP mongodb_command_duration_seconds Server round trip per command, by collection.",
+                "# TYPE mongodb_command_duration_seconds histogram",
+            ]
+            for (database, collection, command), histogram in latency:
+                lines.extend(histogram.samples(
+                    "mongodb_command_duration_seconds",
+                    f'database="{_label_value(database)}",collection="{_label_value(collection)}",'
+                    f'command="{command}"',
+                ))
+        lines += [
+            "# HELP mongodb_documents_returned_total Documents returned in cursor batches.",
+            "# TYPE mongodb_documents_returned_total counter",
+        ]
+        for (database, collection, command), count in documents:
+            lines.append(
+                f'mongodb_documents_returned_total{{database="{_label_value(database)}",'
+                f'collection="{_label_value(collection)}",command="{command}"}} {count}'
+            )
+        lines += [
+            "# HELP mongodb_command_failures_total Commands that returned an error.",
+            "# TYPE mongodb_command_failures_total counter",
+        ]
+        for (database, collection, command), count in failures:
+            lines.append(
+                f'mongodb_command_failures_total{{database="{_label_value(database)}",'
+                f'collection="{_label_value(collection)}",command="{command}"}} {count}'
+            )
+        return lines
+
+
+def render_stats(prefix, stats, help_text, counters=()):
+    """Prometheus lines for a flat dict of numeric stats.
+
+    Keys in ``counters`` are exposed as ``<prefix>_<key>_total`` counters,
+    other numeric values as gauges.
+    """
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        kind = "counter" if key in counters else "gauge"
+        name = f"{prefix}_{key}_total" if kind == "counter" else f"{prefix}_{key}"
+        lines.append(f"# HELP {name} {help_text}: {key.replace('_', ' ')}.")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return lines
@@ -0,0 +1,295 @@
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from operator import itemgetter
+
+import numpy as np
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "at", "by", "for", "from", "in", "into", "its", "of",
+    "on", "or", "the", "to", "with",
+})
+
+# Field weights: a hit in a name counts for far more than one in a description.
+FIELD_WEIGHTS = {"name": 3.0, "description": 1.0}
+
+# A prefix hit is scored as a full hit scaled by this factor.
+PREFIX_WEIGHT = 0.6
+
+# Prefix expansion is capped so one-letter queries stay cheap on big indexes.
+MAX_PREFIX_EXPANSIONS = 64
+
+# Terms with at least this many postings get their impact-ordered list built
+# during sync instead of on the first query that needs it.
+PRESORT_POSTINGS = 128
+
+# The average document length BM25 normalises by is only re-based once it
+# drifts this far, so a small sync re-scores just what it touched.
+AVG_LENGTH_DRIFT = 0.05
+
+
+def _split(text):
+    text = text or ""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(text.lower())
+
+
+def tokenize(text):
+    """Lowercase, strip accents and split ``text`` into indexable tokens."""
+    return [t for t in _split(text) if t not in STOPWORDS]
+
+
+class SearchIndex:
+    """In-memory inverted index over catalog documents.
+
+    Documents are dicts keyed by ``(kind, id)`` with ``name`` and
+    ``description`` fields. ``sync()`` applies only the documents that were
+    added, changed or removed since the last call, so a catalog change does
+    not rebuild the whole index. Queries rank with a BM25-style score; the
+    last query token also matches as a prefix so the index can serve
+    typeahead.
+
+    Queries walk each term's postings in descending order of impact (its
+    BM25 contribution) and stop as soon as no unseen document can reach the
+    current top ``limit``, so common terms cost about as much as rare ones.
+    An index is not safe to query while another thread syncs it.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.version = None
+        self._docs = {}
+        self._fingerprints = {}
+        self._lengths = {}
+        self._norms = {}
+        self._impacts = {}
+        self._avg_length = None
+        self._dirty_docs = set()
+        self._dirty_terms = set()
+        self._postings = defaultdict(dict)
+        self._terms = []
+        self._terms_dirty = False
+        self._total_length = 0.0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def sync(self, docs, version, within=None):
+        """Bring the index in line with ``docs`` and record ``version``.
+
+        With ``within``, ``docs`` only covers the indexed documents that
+        pass ``within(doc)``; the others are left as they are.
+        Returns ``(added, updated, removed)`` counts.
+        """
+        incoming = {}
+        for doc in docs:
+            incoming[(doc["kind"], doc["id"])] = doc
+        removed = [
+            key for key, doc in self._docs.items()
+            if key not in incoming and (within is None or within(doc))
+        ]
+        for key in removed:
+            self._remove(key)
+        added = updated = 0
+        for key, doc in incoming.items():
+            fingerprint = (doc.get("name"), doc.get("description"))
+            if self._fingerprints.get(key) == fingerprint:
+                self._docs[key] = doc
+                continue
+            if key in self._docs:
+                self._remove(key)
+                updated += 1
+            else:
+                added += 1
+            self._add(key, doc, fingerprint)
+        self._refresh_norms()
+        self.version = version
+        return added, updated, len(removed)
+
+    def _refresh_norms(self):
+        avg_length = (self._total_length / len(self._docs) if self._docs else 0.0) or 1.0
+        if self._avg_length is None or abs(avg_length - self._avg_length) > AVG_LENGTH_DRIFT * self._avg_length:
+            self._avg_length = avg_length
+            self._norms = {}
+            self._impacts = {}
+            docs, terms = self._lengths, list(self._postings)
+        else:
+            docs, terms = self._dirty_docs, self._dirty_terms
+        k1, b = self.k1, self.b
+        for key in docs:
+            if key in self._lengths:
+                self._norms[key] = k1 * (1 - b + b * self._lengths[key] / self._avg_length)
+        for term in terms:
+            self._impacts.pop(term, None)
+            if len(self._postings.get(term, ())) >= PRESORT_POSTINGS:
+                self._impact_order(term)
+        self._dirty_docs = set()
+        self._dirty_terms = set()
+
+    def _impact_order(self, term):
+        """``(impacts, keys)`` for ``term``, highest impact (BM25 term score) first."""
+        ranked = self._impacts.get(term)
+        if ranked is None:
+            postings = self._postings[term]
+            keys = list(postings)
+            tfs = np.fromiter(postings.values(), dtype=np.float64, count=len(keys))
+            norms = np.fromiter((self._norms[key] for key in keys), dtype=np.float64, count=len(keys))
+            impacts = tfs / (tfs + norms)
+            order = np.argsort(-impacts, kind="stable")
+            ranked = self._impacts[term] = (impacts[order], [keys[i] for i in order])
+        return ranked
+
+    def _stream(self, group):
+        """Yield ``(score, key)`` over a token's terms, highest score first."""
+        def scaled(term, factor, chunk=256):
+            impacts, keys = self._impact_order(term)
+            for start in range(0, len(keys), chunk):
+                for impact, key in zip(impacts[start:start + chunk].tolist(), keys[start:start + chunk]):
+                    yield factor * impact, key
+        streams = [scaled(term, factor) for term, factor, _ in group]
+        return heapq.merge(*streams, key=itemgetter(0), reverse=True)
+
+    def _add(self, key, doc, fingerprint):
+        length = 0.0
+        weighted = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            tokens = tokenize(doc.get(field))
+            length += len(tokens)
+            for token in tokens:
+                weighted[token] += weight
+        for token, tf in weighted.items():
+            if token not in self._postings:
+                self._terms_dirty = True
+            self._postings[token][key] = tf
+        self._dirty_terms.update(weighted)
+        self._dirty_docs.add(key)
+        self._docs[key] = doc
+        self._fingerprints[key] = fingerprint
+        self._lengths[key] = length
+        self._total_length += length
+
+    def _remove(self, key):
+        doc = self._docs.pop(key)
+        self._fingerprints.pop(key, None)
+        self._total_length -= self._lengths.pop(key, 0.0)
+        self._norms.pop(key, None)
+        for field in FIELD_WEIGHTS:
+            for token in set(tokenize(doc.get(field))):
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop(key, None)
+                self._dirty_terms.add(token)
+                if not postings:
+                    del self._postings[token]
+                    self._terms_dirty = True
+
+    def _expand_prefix(self, prefix):
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect_left(self._terms, prefix)
+        matches = []
+        for term in self._terms[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def _groups(self, query):
+        """One group of ``(term, factor, postings)`` per query token.
+
+        A document matches when every group has a term it contains, and the
+        token scores as the best of those terms. Empty when some token
+        matches nothing.
+        """
+        raw = _split(query)
+        if not raw or not self._docs:
+            return []
+        # The last token is what the user is still typing: it is matched as
+        # a prefix even when it is a stopword on its own.
+        tokens = [t for t in raw[:-1] if t not in STOPWORDS] + raw[-1:]
+        n_docs = len(self._docs)
+        boost = self.k1 + 1
+        groups = []
+        for position, token in enumerate(tokens):
+            terms = [(token, 1.0)]
+            if position == len(tokens) - 1:
+                terms += [(t, PREFIX_WEIGHT) for t in self._expand_prefix(token) if t != token]
+            group = []
+            for term, weight in terms:
+                postings = self._postings.get(term)
+                if postings:
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    group.append((term, weight * idf * boost, postings))
+            if not group:
+                return []
+            groups.append(group)
+        return groups
+
+    def search(self, query, limit=10, kinds=None):
+        groups = self._groups(query)
+        if not groups:
+            return []
+
+        # Threshold algorithm: pull from every token's impact-ordered stream
+        # in turn and score each new document in full. The sum of the
+        # streams' current heads bounds any document not seen yet, so once
+        # the limit-th best score beats it the ranking is final. Once one
+        # stream runs dry, every document matching all tokens has been seen.
+        norms = self._norms
+        streams = [self._stream(group) for group in groups]
+        heads = [next(stream) for stream in streams]
+        scores = {}
+        best = []
+        while True:
+            if len(best) == limit and best[0] > sum(head[0] for head in heads):
+                break
+            for i, stream in enumerate(streams):
+                key = heads[i][1]
+                heads[i] = next(stream, None)
+                if key in scores or (kinds and key[0] not in kinds):
+                    continue
+                score = self._score(groups, key, norms[key])
+                scores[key] = score
+                if score:
+                    if len(best) < limit:
+                        heapq.heappush(best, score)
+                    elif score > best[0]:
+                        heapq.heapreplace(best, score)
+                if heads[i] is None:
+                    break
+            if None in heads:
+                break
+
+        ranked = heapq.nsmallest(
+            limit, ((key, score) for key, score in scores.items() if score),
+            key=lambda item: (-item[1], item[0]),
+        )
+        return [(self._docs[key], score) for key, score in ranked]
+
+    @staticmethod
+    def _score(groups, key, norm):
+        total = 0.0
+        for group in groups:
+            token_score = 0.0
+            for _, factor, postings in group:
+                tf = postings.get(key)
+                if tf is not None:
+                    score = factor * (tf / (tf + norm))
+                    if score > token_score:
+                        token_score = score
+            if not token_score:
+                return 0.0
+            total += token_score
+        return total
@@ -1,25 +1,87 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import json
+import base64
+import binascii
+import asyncio
+import hashlib
+import heapq
+import itertools
 import logging
+import uuid
+import functools
+import re
+import tempfile
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, create_model
+from typing import Dict, List, Optional, Union
 from datetime import datetime, timezone
 
+import catalog_stats
+from catalog_cache import CatalogCache, CatalogLoadTimeout
+from search_index import SearchIndex
+from geo_index import GeoIndex
+from facets import FacetArrays, normalize_catalog, place_facets
+from similarity import SimilarityIndex
+from itinerary import plan_route
+from compression import CompressionMiddleware, CompressionStats
+from admission import AdmissionControl, AdmissionMiddleware, RouteLimit
+from conditional import ConditionalGetMiddleware, etag_matches
+from images import (
+    MEDIA_TYPES, RESIZE_AVAILABLE, DiskCache, ImageFetchError, ImageProxy, UrlFetcher, bucket_width
+)
+from storage import MongoCatalogStore, SnapshotCatalogStore
+from metrics import (
+    PROMETHEUS_CONTENT_TYPE, CommandMetrics, RequestMetrics, RequestTimingMiddleware, render_stats
+)
+
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+command_metrics = CommandMetrics()
+
+# With CATALOG_SNAPSHOT set, the API serves a read-only snapshot file (see
+# snapshot.py) and never connects to MongoDB.
+CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT')
+if CATALOG_SNAPSHOT:
+    client = db = None
+    store = SnapshotCatalogStore(CATALOG_SNAPSHOT)
+else:
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url, event_listeners=[command_metrics])
+    db = client[os.environ['DB_NAME']]
+    store = MongoCatalogStore(db)
 
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
+catalog_cache = CatalogCache(
+    ttl=float(os.environ.get('CATALOG_CACHE_TTL', '300')),
+    max_entries=int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', '1024')),
+    load_timeout=float(os.environ.get('CATALOG_LOAD_TIMEOUT', '10')),
+)
+
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '500'))
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MAX_SEARCH_RESULTS = int(os.environ.get('MAX_SEARCH_RESULTS', '50'))
+MAX_NEARBY_RESULTS = int(os.environ.get('MAX_NEARBY_RESULTS', '100'))
+MAX_SIMILAR_RESULTS = int(os.environ.get('MAX_SIMILAR_RESULTS', '50'))
+MAX_ITINERARY_PLACES = int(os.environ.get('MAX_ITINERARY_PLACES', '200'))
+ITINERARY_TIME_LIMIT = float(os.environ.get('ITINERARY_TIME_LIMIT', '0.5'))
+ITINERARY_CONCURRENCY = int(os.environ.get('ITINERARY_CONCURRENCY', '2'))
+MAX_BATCH_IDS = int(os.environ.get('MAX_BATCH_IDS', '100'))
+HOME_TRENDING_COUNT = int(os.environ.get('HOME_TRENDING_COUNT', '6'))
+HOME_TRENDING_RANK = os.environ.get('HOME_TRENDING_RANK', 'rating')
+GEO_CELL_DEGREES = float(os.environ.get('GEO_CELL_DEGREES', '1.0'))
+IMAGE_CACHE_CONTROL = os.environ.get('IMAGE_CACHE_CONTROL', 'public, max-age=604800, stale-while-revalidate=86400')
+CATALOG_REFRESH_INTERVAL = float(os.environ.get('CATALOG_REFRESH_INTERVAL', '2'))
+CATALOG_CACHE_CONTROL = os.environ.get('CATALOG_CACHE_CONTROL', 'public, max-age=60, stale-while-revalidate=300')
+
 
 class Place(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -33,6 +95,18 @@ class Place(BaseModel):
     location: dict
     best_time: str
     duration: str
+    # Bumped by every write through the place API; sent back in If-Match.
+    rev: int = 0
+
+class PlaceUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    image: Optional[str] = None
+    price: Optional[str] = None
+    rating: Optional[float] = None
+    location: Optional[dict] = None
+    best_time: Optional[str] = None
+    duration: Optional[str] = None
 
 class Country(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -43,44 +117,949 @@ class Country(BaseModel):
     hero_image: str
     places: List[Place]
 
+class CountryCard(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: str
+    name: str
+    description: str
+    hero_image: str
+
+class PlaceCard(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: str
+    country_id: str
+    name: str
+    description: str
+    image: str
+    price: str
+    rating: float
+    duration: str
+
+class HomeBundle(BaseModel):
+    countries: List[CountryCard]
+    trending: List[PlaceCard]
+
+class BatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1)
+
+class PlaceBatch(BaseModel):
+    places: List[Place]
+    missing: List[str]
+
+class CountryBatch(BaseModel):
+    countries: List[Country]
+    missing: List[str]
+
+class FacetedPlaces(BaseModel):
+    count: int
+    places: List[Place]
+    facets: Dict[str, Dict[str, int]]
+
+class NearbyPlace(Place):
+    country_id: str
+    distance_km: float
+
+class SimilarPlace(Place):
+    country_id: str
+    score: float
+
+class ItineraryRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1)
+    start: Optional[str] = None
+    round_trip: bool = False
+
+class ItineraryStop(BaseModel):
+    id: str
+    name: str
+    image: str
+    location: dict
+    duration: str
+    leg_km: float
+
+class Itinerary(BaseModel):
+    stops: List[ItineraryStop]
+    total_distance_km: float
+    return_leg_km: Optional[float] = None
+    days_min: Optional[float] = None
+    days_max: Optional[float] = None
+    duration: Optional[str] = None
+    optimized: bool
+
+class CountryStats(BaseModel):
+    country_id: Optional[str] = None
+    place_count: int
+    rated_count: int
+    mean_rating: Optional[float] = None
+    max_rating: Optional[float] = None
+    price_ranges: Dict[str, int]
+    season_coverage: Dict[str, int]
+    months_in_season: int
+
+class CatalogStats(BaseModel):
+    total: CountryStats
+    countries: List[CountryStats]
+
+class SearchHit(BaseModel):
+    kind: str
+    id: str
+    name: str
+    country_id: Optional[str] = None
+    image: str
+    score: float
+
+# Embedded models that ?fields= can reach into with dotted paths.
+_NESTED_MODELS = {(Country, "places"): Place}
+
 
 @api_router.get("/")
 async def root():
     return {"message": "Travel Recommendation API"}
 
-@api_router.get("/countries", response_model=List[Country])
-async def get_countries():
-    countries = await db.countries.find({}, {"_id": 0}).to_list(100)
-    return countries
+def _encode_cursor(position):
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor, shape):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (not isinstance(position, list) or len(position) != len(shape)
+            or not all(isinstance(v, t) for v, t in zip(position, shape))):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+def _wants_ndjson(request: Request, format: Optional[str]):
+    if format is not None:
+        return format == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def _parse_fields(fields: Optional[str], model):
+    """Turn ``?fields=a,b,places.c`` into a frozenset of field paths.
+
+    ``id`` is always included, at every level that is asked for. Returns ``None`` when no fieldset was asked
+    for, so callers can keep the full-model path.
+    """
+    if fields is None:
+        return None
+    selected = {"id"}
+    for path in filter(None, (f.strip() for f in fields.split(','))):
+        name, _, sub = path.partition('.')
+        nested = _NESTED_MODELS.get((model, name))
+        if name not in model.model_fields or (sub and (nested is None or sub not in nested.model_fields)):
+            raise HTTPException(status_code=400, detail=f"Unknown field: {path}")
+        selected.add(path)
+        if sub:
+            selected.add(f"{name}.id")
+    # A whole embedded list wins over individual sub-fields of it, which
+    # Mongo would otherwise reject as a path collision.
+    return frozenset(p for p in selected if p.partition('.')[0] not in selected or '.' not in p)
+
+def _fields_key(selected):
+    return ','.join(sorted(selected)) if selected else '*'
+
+@functools.lru_cache(maxsize=256)
+def _trimmed_model(model, selected):
+    subfields = {}
+    for path in selected:
+        name, _, sub = path.partition('.')
+        subfields.setdefault(name, set())
+        if sub:
+            subfields[name].add(sub)
+    definitions = {}
+    for name in model.model_fields:
+        if name not in subfields:
+            continue
+        subs = subfields[name]
+        annotation = model.model_fields[name].annotation
+        if name not in selected:
+            nested = _trimmed_model(_NESTED_MODELS[(model, name)], frozenset(subs))
+            annotation = List[nested]
+        definitions[name] = (annotation, ...)
+    return create_model(
+        f"{model.__name__}Fields", __config__=ConfigDict(extra="ignore"), **definitions
+    )
+
+@functools.lru_cache(maxsize=256)
+def _trimmed_adapter(model, selected, many):
+    trimmed = _trimmed_model(model, selected) if selected else model
+    return TypeAdapter(List[trimmed] if many else trimmed)
+
+def _json_response(body, headers=None):
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def _cached_json(key, loader, model, selected=None, many=True):
+    """Rendered JSON bytes for a catalog read, built once per catalog version.
+
+    The loaded data is validated and serialized by pydantic-core the first
+    time; every later hit reuses the same bytes object without touching
+    Mongo, the models or the encoder. ``None`` results (not found) are not
+    cached.
+    """
+    async def render():
+        data = await loader()
+        return None if data is None else _render_json(data, model, selected, many)
+    return await catalog_cache.get_or_load(f"json:{key}", render)
+
+def _render_json(data, model, selected=None, many=True):
+    adapter = _trimmed_adapter(model, selected, many)
+    return adapter.dump_json(adapter.validate_python(data))
+
+async def _cached_json_page(key, loader, model, selected=None):
+    async def render():
+        items, next_cursor = await loader()
+        adapter = _trimmed_adapter(model, selected, True)
+        return adapter.dump_json(adapter.validate_python(items)), next_cursor
+    return await catalog_cache.get_or_load(f"json:{key}", render)
+
+async def _ndjson(docs, model):
+    async for doc in docs:
+        yield model.model_validate(doc).model_dump_json() + "\n"
+
+def _countries_position(after):
+    return _decode_cursor(after, (str,))[0] if after is not None else None
+
+def _places_position(after):
+    return tuple(_decode_cursor(after, (str, int))) if after is not None else None
+
+async def _load_countries_page(limit, after, selected):
+    countries = await store.countries_page(_countries_position(after), limit + 1, selected)
+    next_cursor = _encode_cursor([countries[limit - 1]['id']]) if len(countries) > limit else None
+    return countries[:limit], next_cursor
+
+async def _stream_places(rows):
+    async for row in rows:
+        yield row['place']
+
+async def _load_places_page(limit, after, selected):
+    rows = await store.places_page(_places_position(after), limit + 1, selected)
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = _encode_cursor([last['country_id'], last['pos']])
+    return [row['place'] for row in rows[:limit]], next_cursor
+
+async def _cached_countries():
+    return await catalog_cache.get_or_load(
+        "countries",
+        store.list_countries
+    )
+
+def _batch_ids(ids):
+    ids = list(dict.fromkeys(i.strip() for i in ids if i and i.strip()))
+    if not ids:
+        raise HTTPException(status_code=400, detail="No ids given")
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per batch")
+    return ids
+
+def _render_batch(key, ids, found, model, selected):
+    # Results follow the request order; ids that matched nothing are listed
+    # under "missing" instead of failing the whole batch.
+    adapter = _trimmed_adapter(model, selected, True)
+    items = adapter.validate_python([found[i] for i in ids if i in found])
+    return JSONResponse({
+        key: adapter.dump_python(items, mode="json"),
+        "missing": [i for i in ids if i not in found],
+    })
+
+async def _batch_countries(ids, selected):
+    ids = _batch_ids(ids)
+    docs = await store.get_countries(ids, selected)
+    return _render_batch("countries", ids, {doc['id']: doc for doc in docs}, Country, selected)
+
+@api_router.post("/countries/batch", response_model=CountryBatch)
+async def get_countries_batch(batch: BatchRequest, fields: Optional[str] = None):
+    return await _batch_countries(batch.ids, _parse_fields(fields, Country))
+
+@api_router.get("/countries", response_model=Union[List[Country], CountryBatch])
+async def get_countries(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+):
+    """All countries, a page of them, or with ``?ids=`` a batch with the ids not found."""
+    selected = _parse_fields(fields, Country)
+    if ids is not None:
+        return await _batch_countries(ids.split(','), selected)
+    if _wants_ndjson(request, format):
+        cursor = store.stream_countries(_countries_position(after), limit, selected)
+        model = _trimmed_model(Country, selected) if selected else Country
+        return StreamingResponse(_ndjson(cursor, model), media_type=NDJSON_MEDIA_TYPE)
+
+    if limit is None and after is None:
+        if selected is None:
+            loader = _cached_countries
+        else:
+            loader = lambda: store.list_countries(selected)
+        body = await _cached_json(f"countries:{_fields_key(selected)}", loader, Country, selected)
+        return _json_response(body)
+
+    limit = limit or MAX_PAGE_SIZE
+    body, next_cursor = await _cached_json_page(
+        f"countries:{_fields_key(selected)}:page:{limit}:{after}",
+        lambda: _load_countries_page(limit, after, selected),
+        Country, selected
+    )
+    return _json_response(body, {"X-Next-Cursor": next_cursor} if next_cursor else None)
 
 @api_router.get("/countries/{country_id}", response_model=Country)
-async def get_country(country_id: str):
-    country = await db.countries.find_one({"id": country_id}, {"_id": 0})
-    if not country:
+async def get_country(country_id: str, fields: Optional[str] = None):
+    selected = _parse_fields(fields, Country)
+    body = await _cached_json(
+        f"country:{country_id}:{_fields_key(selected)}",
+        lambda: store.get_country(country_id, selected),
+        Country, selected, many=False
+    )
+    if body is None:
         raise HTTPException(status_code=404, detail="Country not found")
-    return country
+    return _json_response(body)
 
-@api_router.get("/places", response_model=List[Place])
-async def get_all_places():
-    places = []
-    countries = await db.countries.find({}, {"_id": 0}).to_list(100)
-    for country in countries:
-        places.extend(country.get('places', []))
-    return places
+@api_router.get("/countries/{country_id}/stats", response_model=CountryStats)
+async def get_country_stats(country_id: str):
+    async def load():
+        summary = await store.get_stats(country_id)
+        return summary and catalog_stats.render(summary)
+    body = await _cached_json(f"stats:{country_id}", load, CountryStats, many=False)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Country not found")
+    return _json_response(body)
+
+def _writable():
+    if store.read_only:
+        raise HTTPException(status_code=405, detail="Catalog is served from a read-only snapshot")
+
+def _place_etag(place):
+    # The id keeps revisions of different places apart in anything that
+    # keys on the ETag alone, such as HTTP caches.
+    return f'"{place["id"]}-{place.get("rev", 0)}"'
+
+def _expected_rev(if_match, place_id):
+    """The revision of ``place_id`` an If-Match header requires, or None for no precondition."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tagged, _, rev = if_match.strip().removeprefix("W/").strip('"').rpartition("-")
+    if tagged != place_id:
+        raise HTTPException(status_code=412, detail="If-Match does not name a revision of this place")
+    try:
+        return int(rev)
+    except ValueError:
+        raise HTTPException(status_code=412, detail="If-Match does not name a place revision")
+
+def _place_response(place, status_code=200):
+    body = Place.model_validate(place).model_dump(mode="json")
+    return JSONResponse(body, status_code=status_code, headers={"ETag": _place_etag(place)})
+
+async def _place_written(country_id, place_id, old, new):
+    # Summaries first, so workers that refresh on the new version see them.
+    await store.inc_stats(country_id, catalog_stats.counters_delta(old, new))
+    meta = await store.update_meta({
+        "seed_hash": None,
+        "tag": uuid.uuid4().hex,
+        "source": "api",
+        "change": {"country_id": country_id, "place_id": place_id},
+        "updated_at": datetime.now(timezone.utc)
+    })
+    # Single-place, single-country and statistics reads load from the store
+    # again right away; catalog-wide reads move to the new catalog once it
+    # is built, here as on every other worker.
+    catalog_cache.discard(functools.partial(_stale_after, meta["change"]))
+    _schedule_refresh(meta)
+
+@api_router.get("/countries/{country_id}/places/{place_id}", response_model=Place)
+async def get_country_place(country_id: str, place_id: str):
+    """One place, read from the store with its revision as the ETag.
+
+    The catalog reads carry catalog-wide validators; this is the read to
+    take an If-Match value from for a PATCH or DELETE of the place.
+    """
+    place = await store.get_country_place(country_id, place_id)
+    if place is None:
+        raise HTTPException(status_code=404, detail="Place not found")
+    return _place_response(place)
+
+@api_router.post("/countries/{country_id}/places/{place_id}", response_model=Place, status_code=201)
+async def create_place(country_id: str, place_id: str, place: Place):
+    _writable()
+    if place.id != place_id:
+        raise HTTPException(status_code=400, detail="Place id does not match the URL")
+    new = dict(place.model_dump(), rev=0)
+    new["facets"] = place_facets(new)
+    if not await store.insert_place(country_id, new):
+        if await store.get_country(country_id, frozenset({"id"})) is None:
+            raise HTTPException(status_code=404, detail="Country not found")
+        raise HTTPException(status_code=409, detail="Place already exists")
+    await _place_written(country_id, place_id, None, new)
+    return _place_response(new, status_code=201)
+
+@api_router.patch("/countries/{country_id}/places/{place_id}", response_model=Place)
+async def update_place(
+    country_id: str, place_id: str, update: PlaceUpdate, if_match: Optional[str] = Header(None)
+):
+    """Change some fields of a place; fields that are absent or null are left alone.
+
+    With ``If-Match: "<place_id>-<rev>"`` (the ETag of a GET of the same
+    URL) the update applies only if the place is still at that revision.
+    Either way the write is conditional on the revision
+    read here, so concurrent updates never overwrite each other silently.
+    """
+    _writable()
+    fields = {name: value for name, value in update.model_dump(exclude_unset=True).items() if value is not None}
+    if not fields:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    expected = _expected_rev(if_match, place_id)
+    old = await store.get_country_place(country_id, place_id)
+    if old is None:
+        raise HTTPException(status_code=404, detail="Place not found")
+    rev = old.get("rev", 0)
+    if expected is not None and expected != rev:
+        raise HTTPException(status_code=412, detail="Place has been modified")
+    new = dict(old, **fields, rev=rev + 1)
+    new["facets"] = place_facets(new)
+    if not await store.update_place(country_id, place_id, rev, dict(fields, facets=new["facets"])):
+        raise HTTPException(status_code=412 if expected is not None else 409, detail="Place has been modified")
+    await _place_written(country_id, place_id, old, new)
+    return _place_response(new)
+
+@api_router.delete("/countries/{country_id}/places/{place_id}", status_code=204)
+async def delete_place(country_id: str, place_id: str, if_match: Optional[str] = Header(None)):
+    _writable()
+    expected = _expected_rev(if_match, place_id)
+    old = await store.get_country_place(country_id, place_id)
+    if old is None:
+        raise HTTPException(status_code=404, detail="Place not found")
+    rev = old.get("rev", 0)
+    if expected is not None and expected != rev:
+        raise HTTPException(status_code=412, detail="Place has been modified")
+    if not await store.delete_place(country_id, place_id, rev):
+        raise HTTPException(status_code=412 if expected is not None else 409, detail="Place has been modified")
+    await _place_written(country_id, place_id, old, None)
+    return Response(status_code=204)
+
+def _all_places(countries):
+    return [place for country in countries for place in country.get('places', [])]
+
+async def _load_all_places():
+    return _all_places(await _cached_countries())
+
+async def _batch_places(ids, selected):
+    ids = _batch_ids(ids)
+    found = {place['id']: place for place in await store.get_places(ids)}
+    return _render_batch("places", ids, found, Place, selected)
+
+@api_router.post("/places/batch", response_model=PlaceBatch)
+async def get_places_batch(batch: BatchRequest, fields: Optional[str] = None):
+    return await _batch_places(batch.ids, _parse_fields(fields, Place))
+
+def _place_rows(countries):
+    return [(country['id'], place) for country in countries for place in country.get('places', [])]
+
+async def _build_facet_arrays():
+    return FacetArrays(_place_rows(await _cached_countries()))
+
+async def _faceted_places(filters, with_facets, limit, selected):
+    arrays = await catalog_cache.get_or_load("facet_arrays", _build_facet_arrays)
+    idx = arrays.filter(**filters)
+    adapter = _trimmed_adapter(Place, selected, True)
+    places = adapter.validate_python([arrays.rows[i][1] for i in (idx[:limit] if limit else idx)])
+    if not with_facets:
+        return Response(content=adapter.dump_json(places), media_type="application/json")
+    return JSONResponse({
+        "count": len(idx),
+        "places": adapter.dump_python(places, mode="json"),
+        "facets": arrays.counts(idx),
+    })
+
+@api_router.get("/places", response_model=Union[List[Place], PlaceBatch, FacetedPlaces])
+async def get_all_places(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    fields: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    month: Optional[int] = Query(None, ge=1, le=12),
+    max_days: Optional[float] = Query(None, gt=0),
+    facets: bool = False,
+    ids: Optional[str] = None,
+):
+    """All places or a page of them; filtered places, with facet counts when
+    ``facets=true``; or with ``?ids=`` a batch with the ids not found."""
+    selected = _parse_fields(fields, Place)
+    if ids is not None:
+        return await _batch_places(ids.split(','), selected)
+    filters = {
+        name: value for name, value in (
+            ("min_price", min_price), ("max_price", max_price), ("min_rating", min_rating),
+            ("month", month), ("max_days", max_days),
+        ) if value is not None
+    }
+    if filters or facets:
+        # Filtered reads are answered from precomputed column arrays; they
+        # support ?limit= and ?fields= but not cursors or streaming.
+        if after is not None or _wants_ndjson(request, format):
+            raise HTTPException(status_code=400, detail="Filters cannot be combined with after or ndjson")
+        return await _faceted_places(filters, facets, limit, selected)
+    if _wants_ndjson(request, format):
+        rows = store.stream_places(_places_position(after), limit, selected)
+        model = _trimmed_model(Place, selected) if selected else Place
+        return StreamingResponse(_ndjson(_stream_places(rows), model), media_type=NDJSON_MEDIA_TYPE)
+
+    if limit is None and after is None:
+        if selected is None:
+            loader = _load_all_places
+        else:
+            loader = lambda: store.list_places(selected)
+        body = await _cached_json(f"places:{_fields_key(selected)}", loader, Place, selected)
+        return _json_response(body)
+
+    limit = limit or MAX_PAGE_SIZE
+    body, next_cursor = await _cached_json_page(
+        f"places:{_fields_key(selected)}:page:{limit}:{after}",
+        lambda: _load_places_page(limit, after, selected),
+        Place, selected
+    )
+    return _json_response(body, {"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+def _geo_items(rows):
+    for country_id, place in rows:
+        location = place.get('location') or {}
+        if location.get('lat') is None or location.get('lng') is None:
+            continue
+        yield float(location['lat']), float(location['lng']), (country_id, place)
+
+def _geo_index(countries):
+    return GeoIndex(_geo_items(_place_rows(countries)), cell_deg=GEO_CELL_DEGREES)
+
+async def _build_geo_index():
+    return _geo_index(await _cached_countries())
+
+@api_router.get("/places/nearby", response_model=List[NearbyPlace])
+async def get_nearby_places(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(250, gt=0, le=20038),
+    k: int = Query(10, ge=1, le=MAX_NEARBY_RESULTS),
+):
+    index = await catalog_cache.get_or_load("geo_index", _build_geo_index)
+    return [
+        dict(place, country_id=country_id, distance_km=round(distance, 3))
+        for (country_id, place), distance in index.nearest(lat, lng, radius_km, k)
+    ]
+
+async def _build_similarity_index():
+    rows = _place_rows(await _cached_countries())
+    # Tokenizing every description takes seconds on a large catalog; keep
+    # it off the event loop.
+    return await asyncio.to_thread(SimilarityIndex, rows)
+
+@api_router.get("/places/{place_id}/similar", response_model=List[SimilarPlace])
+async def get_similar_places(place_id: str, k: int = Query(6, ge=1, le=MAX_SIMILAR_RESULTS)):
+    index = await catalog_cache.get_or_load("similarity_index", _build_similarity_index)
+    if place_id not in index:
+        raise HTTPException(status_code=404, detail="Place not found")
+    return [
+        dict(place, country_id=country_id, score=round(score, 4))
+        for country_id, place, score in index.similar(place_id, k)
+    ]
 
 @api_router.get("/places/{place_id}", response_model=Place)
-async def get_place(place_id: str):
-    countries = await db.countries.find({}, {"_id": 0}).to_list(100)
+async def get_place(place_id: str, fields: Optional[str] = None):
+    selected = _parse_fields(fields, Place)
+    body = await _cached_json(
+        f"place:{place_id}:{_fields_key(selected)}",
+        lambda: store.get_place(place_id),
+        Place, selected, many=False
+    )
+    if body is None:
+        raise HTTPException(status_code=404, detail="Place not found")
+    return _json_response(body)
+
+def _home(countries, trending, rank):
+    rows = ((country['id'], place) for country in countries for place in country.get('places', []))
+    if rank == "rating":
+        # nsmallest() is sorted()[:n], so equal ratings keep catalog order.
+        rows = heapq.nsmallest(trending, rows, key=lambda row: -row[1].get('rating', 0))
+    places = [dict(place, country_id=country_id) for country_id, place in itertools.islice(rows, trending)]
+    return {"countries": countries, "trending": places}
+
+async def _load_home(trending, rank):
+    return _home(await _cached_countries(), trending, rank)
+
+@api_router.get("/home", response_model=HomeBundle)
+async def get_home(
+    trending: int = Query(HOME_TRENDING_COUNT, ge=0, le=50),
+    rank: str = Query(HOME_TRENDING_RANK, pattern="^(rating|catalog)$"),
+):
+    body = await _cached_json(
+        f"home:{trending}:{rank}", lambda: _load_home(trending, rank), HomeBundle, many=False
+    )
+    return _json_response(body)
+
+# Route planning is CPU-bound: it runs on worker threads, a few at a time,
+# each within ITINERARY_TIME_LIMIT.
+_itinerary_slots = asyncio.Semaphore(ITINERARY_CONCURRENCY)
+
+def _format_days(low, high):
+    if low is None:
+        return None
+    return f"{low:g} days" if low == high else f"{low:g}-{high:g} days"
+
+@api_router.post("/itinerary", response_model=Itinerary)
+async def plan_itinerary(request: ItineraryRequest):
+    ids = list(dict.fromkeys(request.ids))
+    if len(ids) > MAX_ITINERARY_PLACES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ITINERARY_PLACES} places per itinerary")
+    if request.start is not None and request.start not in ids:
+        raise HTTPException(status_code=400, detail="start must be one of ids")
+    found = {place['id']: place for place in await store.get_places(ids)}
+    missing = [i for i in ids if i not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Places not found: {', '.join(missing)}")
+    places = [found[i] for i in ids]
+    if any((p.get('location') or {}).get('lat') is None or (p.get('location') or {}).get('lng') is None
+           for p in places):
+        raise HTTPException(status_code=400, detail="Every place needs a location")
+
+    start = ids.index(request.start) if request.start is not None else 0
+    async with _itinerary_slots:
+        order, legs, optimized = await asyncio.to_thread(
+            plan_route,
+            [float(p['location']['lat']) for p in places],
+            [float(p['location']['lng']) for p in places],
+            start, request.round_trip, ITINERARY_TIME_LIMIT,
+        )
+
+    stops = [dict(places[i], leg_km=round(leg, 3)) for i, leg in zip(order, legs)]
+    facets = [p.get('facets') or place_facets(p) for p in places]
+    days_min = days_max = None
+    if all(f['days_min'] is not None for f in facets):
+        days_min = sum(f['days_min'] for f in facets)
+        days_max = sum(f['days_max'] for f in facets)
+    return {
+        "stops": stops,
+        "total_distance_km": round(sum(legs), 3),
+        "return_leg_km": round(legs[-1], 3) if request.round_trip else None,
+        "days_min": days_min,
+        "days_max": days_max,
+        "duration": _format_days(days_min, days_max),
+        "optimized": optimized,
+    }
+
+image_proxy = ImageProxy(
+    UrlFetcher(
+        os.environ.get('IMAGE_ORIGIN_HOSTS', 'images.unsplash.com').split(','),
+        timeout=float(os.environ.get('IMAGE_FETCH_TIMEOUT', '10')),
+    ),
+    DiskCache(
+        os.environ.get('IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'travel-image-cache')),
+        max_bytes=int(os.environ.get('IMAGE_CACHE_MAX_BYTES', str(256 * 2 ** 20))),
+    ),
+    workers=int(os.environ.get('IMAGE_WORKERS', '2')),
+)
+
+def _image_urls(countries):
+    urls = {}
+    for country in countries:
+        urls.setdefault(country['id'], country['hero_image'])
+        for place in country.get('places', []):
+            urls[place['id']] = place['image']
+    return urls
+
+async def _load_image_urls():
+    return _image_urls(await _cached_countries())
+
+@api_router.get("/images/{image_id}")
+async def get_image(image_id: str, request: Request, w: int = Query(640, ge=16, le=4096)):
+    """Thumbnail of a place image, or of a country hero image for a country id."""
+    urls = await catalog_cache.get_or_load("image_urls", _load_image_urls)
+    url = urls.get(image_id)
+    if url is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not RESIZE_AVAILABLE:
+        return RedirectResponse(url)
+
+    fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+    width = bucket_width(w)
+    headers = {
+        "ETag": f'"{ImageProxy.variant_name(url, width, fmt)}"',
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+        "Vary": "Accept",
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"], exists=True):
+        return Response(status_code=304, headers=headers)
+    try:
+        data = await image_proxy.thumbnail(url, width, fmt)
+    except ImageFetchError as exc:
+        logger.warning("Image %s unavailable: %s", image_id, exc)
+        raise HTTPException(status_code=502, detail="Origin image unavailable")
+    return Response(content=data, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+# Two indexes take turns: the one not being served is synced to the next
+# catalog version on the refresh thread, then swapped in. Syncing the standby
+# only applies what changed since it was last live.
+_search_indexes = [SearchIndex(), SearchIndex()]
+# Countries changed since the standby was last synced, when that is known;
+# then only their documents are compared.
+_standby_behind = None
+
+def _search_owner(doc):
+    return doc['id'] if doc['kind'] == "country" else doc['country_id']
+
+def _search_documents(countries):
     for country in countries:
+        yield {
+            "kind": "country",
+            "id": country['id'],
+            "name": country['name'],
+            "description": country['description'],
+            "image": country['hero_image'],
+        }
         for place in country.get('places', []):
-            if place['id'] == place_id:
-                return place
-    raise HTTPException(status_code=404, detail="Place not found")
+            yield {
+                "kind": "place",
+                "id": place['id'],
+                "name": place['name'],
+                "description": place['description'],
+                "country_id": country['id'],
+                "image": place['image'],
+            }
+
+def _build_search_index(countries):
+    index = SearchIndex()
+    index.sync(_search_documents(countries), None)
+    return index
+
+async def _load_search_index():
+    return await asyncio.to_thread(_build_search_index, await _cached_countries())
+
+@api_router.get("/search", response_model=List[SearchHit])
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=MAX_SEARCH_RESULTS),
+    type: Optional[str] = Query(None, pattern="^(place|country)$"),
+):
+    index = await catalog_cache.get_or_load("search_index", _load_search_index)
+    hits = index.search(q, limit=limit, kinds={type} if type else None)
+    return [dict(doc, score=round(score, 4)) for doc, score in hits]
+
+_STATS_SORTS = {
+    "id": lambda s: s["country_id"],
+    "place_count": lambda s: -s["place_count"],
+    # Unrated countries go last.
+    "mean_rating": lambda s: -(s["mean_rating"] or -1),
+    "max_rating": lambda s: -(s["max_rating"] or -1),
+}
+
+async def _load_stats(sort):
+    summaries = await store.list_stats()
+    countries = sorted((catalog_stats.render(s) for s in summaries), key=_STATS_SORTS[sort])
+    total = catalog_stats.render(catalog_stats.merge(summaries))
+    return {"total": total, "countries": countries}
+
+@api_router.get("/stats", response_model=CatalogStats)
+async def get_stats(sort: str = Query("id", pattern="^(id|place_count|mean_rating|max_rating)$")):
+    """Per-country and catalog-wide statistics from the materialized summaries."""
+    body = await _cached_json(f"stats:*:{sort}", lambda: _load_stats(sort), CatalogStats, many=False)
+    return _json_response(body)
+
+def _catalog_hash(countries):
+    payload = json.dumps(countries, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _country_json(country):
+    """A country's rendered JSON, and its places' as list items without the brackets."""
+    return _render_json(country, Country, many=False), _render_json(country.get('places', []), Place)[1:-1]
+
+def _json_list(items):
+    return b"[" + b",".join(item for item in items if item) + b"]"
+
+def _country_span(countries, country_id):
+    """``(start, end)`` of ``country_id``'s places in ``_place_rows(countries)``."""
+    start = 0
+    for country in countries:
+        size = len(country.get('places', []))
+        if country['id'] == country_id:
+            return start, start + size
+        start += size
+    return start, start
+
+# Built once per catalog and patched for single-country changes.
+_PATCHED_KEYS = ("countries", "country_json", "facet_arrays", "geo_index", "similarity_index")
+
+def _derive_catalog(countries, search_index, previous=None, country_id=None, search_scope=None):
+    """Cache entries built from a freshly loaded catalog before it goes live.
+
+    Keys match the ones the read paths use, so the first requests after a
+    swap hit the cache instead of rebuilding. When ``previous`` holds the
+    entries of the catalog this one replaces and only ``country_id``
+    differs, the row-level structures are patched for that country's
+    places and the full JSON lists reassembled from per-country pieces.
+    ``search_scope`` limits the search index sync to those countries.
+    """
+    if search_scope is None:
+        added, updated, removed = search_index.sync(_search_documents(countries), None)
+    else:
+        added, updated, removed = search_index.sync(
+            _search_documents([c for c in countries if c['id'] in search_scope]), None,
+            within=lambda doc: _search_owner(doc) in search_scope,
+        )
+    logger.info("Search index synced: +%d ~%d -%d", added, updated, removed)
+    if previous is not None and all(key in previous for key in _PATCHED_KEYS):
+        country = next((c for c in countries if c['id'] == country_id), None)
+        start, end = _country_span(previous["countries"], country_id)
+        changed = _place_rows([country] if country is not None else [])
+        country_json = dict(previous["country_json"])
+        if country is None:
+            country_json.pop(country_id, None)
+        else:
+            country_json[country_id] = _country_json(country)
+        derived = {
+            "country_json": country_json,
+            "facet_arrays": previous["facet_arrays"].spliced(start, end, changed),
+            "geo_index": previous["geo_index"].spliced(
+                lambda payload: payload[0] == country_id, _geo_items(changed)
+            ),
+            "similarity_index": previous["similarity_index"].spliced(start, end, changed),
+        }
+    else:
+        rows = _place_rows(countries)
+        country_json = {country['id']: _country_json(country) for country in countries}
+        derived = {
+            "country_json": country_json,
+            "facet_arrays": FacetArrays(rows),
+            "geo_index": _geo_index(countries),
+            "similarity_index": SimilarityIndex(rows),
+        }
+    derived.update({
+        "countries": countries,
+        "image_urls": _image_urls(countries),
+        "search_index": search_index,
+        "json:countries:*": _json_list(country_json[c['id']][0] for c in countries),
+        "json:places:*": _json_list(country_json[c['id']][1] for c in countries),
+        f"json:home:{HOME_TRENDING_COUNT}:{HOME_TRENDING_RANK}": _render_json(
+            _home(countries, HOME_TRENDING_COUNT, HOME_TRENDING_RANK), HomeBundle, many=False
+        ),
+    })
+    return derived
+
+def _unaffected_by(change, key):
+    """Whether cache entry ``key`` is still valid after ``change`` to one place."""
+    for prefix, changed in (
+        ("json:country:", change["country_id"]),
+        ("json:place:", change["place_id"]),
+        ("json:stats:", change["country_id"]),
+    ):
+        if key.startswith(prefix):
+            name = key[len(prefix):].partition(":")[0]
+            return name not in (changed, "*")
+    return False
+
+def _stale_after(change, key):
+    """Whether cached single-resource read ``key`` is out of date after ``change``."""
+    return key.startswith(("json:country:", "json:place:", "json:stats:")) and not _unaffected_by(change, key)
+
+_refresh_lock = asyncio.Lock()
+_catalog_version = None
+
+async def _refresh_catalog(meta, force=False):
+    """Load the catalog described by ``meta`` and swap it in once it is ready.
+
+    Until the swap, readers keep getting the current version from the
+    cache; the new one is loaded and its derived structures are built on a
+    worker thread, then installed in one step. When ``meta`` is the very
+    next version and records a single place ``change``, only that country
+    is re-read, the derived structures are patched for it, and cached
+    single-country and single-place responses for everything else are
+    kept.
+    """
+    global _catalog_version, _standby_behind
+    async with _refresh_lock:
+        tag = meta and (meta.get("tag") or meta.get("seed_hash"))
+        version = meta and meta.get("version")
+        if not force and (tag == catalog_cache.tag or (
+                version is not None and _catalog_version is not None
+                and version <= _catalog_version)):
+            # Already live, or older than what is: a refresh that read its
+            # meta before a newer one was applied must not roll it back.
+            return False
+        change = meta and meta.get("change")
+        previous = catalog_cache.pinned()
+        keep = patched = None
+        if (not force and change and "countries" in previous
+                and _catalog_version is not None and version == _catalog_version + 1):
+            country = await store.get_country(change["country_id"])
+            countries = [
+                country if c["id"] == change["country_id"] else c for c in previous["countries"]
+            ]
+            countries = [c for c in countries if c is not None]
+            keep = functools.partial(_unaffected_by, change)
+            patched = change["country_id"]
+        else:
+            countries = await store.list_countries()
+        scope = _standby_behind | {patched} if patched and _standby_behind is not None else None
+        # Until the sync below finishes, the standby is in no known state.
+        _standby_behind = None
+        derived = await asyncio.to_thread(
+            _derive_catalog, countries, _search_indexes[1], previous if patched else None, patched, scope
+        )
+        catalog_cache.bump(tag=tag, preload=derived, keep=keep)
+        _search_indexes.reverse()
+        # The index just retired lags the live one by this change alone.
+        _standby_behind = {patched} if patched else None
+        _catalog_version = version
+        logger.info("Catalog %s (meta v%s) loaded: %d countries",
+                    tag and tag[:12], meta and meta.get("version"), len(countries))
+        return True
+
+async def _watch_catalog():
+    """Keep this worker in step with writes made through any other worker."""
+    while True:
+        try:
+            async for meta in store.watch_meta(CATALOG_REFRESH_INTERVAL):
+                await _refresh_catalog(meta)
+            return
+        except Exception:
+            logger.exception("Catalog refresh failed; retrying")
+            await asyncio.sleep(CATALOG_REFRESH_INTERVAL)
+
+_pending_meta = None
+_refresh_task = None
+
+def _schedule_refresh(meta):
+    """Apply ``meta`` in the background, after any refresh already running.
+
+    Writes that land while a catalog is being built are folded into one
+    more refresh, to the newest of their versions.
+    """
+    global _pending_meta, _refresh_task
+    if _pending_meta is None or meta["version"] > _pending_meta["version"]:
+        _pending_meta = meta
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_apply_pending_meta())
+    return _refresh_task
+
+async def _apply_pending_meta():
+    global _pending_meta
+    while _pending_meta is not None:
+        meta, _pending_meta = _pending_meta, None
+        try:
+            await _refresh_catalog(meta)
+        except Exception:
+            # The watcher picks the version up on its next pass.
+            logger.exception("Catalog refresh after a write failed")
+
+_seed_lock = asyncio.Lock()
 
 @api_router.post("/seed")
-async def seed_data():
-    await db.countries.delete_many({})
-    
+async def seed_data(force: bool = False):
     countries_data = [
         {
             "id": "india",
@@ -399,26 +1378,164 @@ async def seed_data():
         }
     ]
     
-    await db.countries.insert_many(countries_data)
-    return {"message": "Data seeded successfully", "count": len(countries_data)}
+    normalize_catalog(countries_data)
+    seed_hash = _catalog_hash(countries_data)
+    if store.read_only:
+        raise HTTPException(status_code=405, detail="Catalog is served from a read-only snapshot")
+    async with _seed_lock:
+        meta = await store.get_meta()
+        if meta and meta.get("source") in ("ingest", "api") and not force:
+            # A bulk-ingested or edited catalog must not be replaced by the
+            # demo seed that the frontend posts on every page load.
+            return {
+                "message": "Catalog has been changed since it was seeded; pass force=true to reseed",
+                "count": await store.count_countries(),
+                "changed": False
+            }
+        if (meta and meta.get("seed_hash") == seed_hash
+                and await store.count_countries() == len(countries_data)):
+            return {"message": "Data already up to date", "count": len(countries_data), "changed": False}
+
+        await store.replace_catalog(countries_data)
+        await store.replace_stats(catalog_stats.build(countries_data))
+        meta = await store.update_meta({
+            "seed_hash": seed_hash,
+            "tag": seed_hash,
+            "source": "seed",
+            "change": None,
+            "updated_at": datetime.now(timezone.utc)
+        })
+        await _refresh_catalog(meta)
+    return {"message": "Data seeded successfully", "count": len(countries_data), "changed": True}
+
+@api_router.get("/metrics")
+async def metrics():
+    lines = request_metrics.render() + command_metrics.render()
+    lines += render_stats(
+        "catalog_cache", catalog_cache.stats(), "Catalog read cache",
+        counters=("hits", "misses", "evictions", "coalesced", "timeouts"),
+    )
+    lines += admission.render()
+    lines += render_stats(
+        "image_proxy", image_proxy.stats(), "Image thumbnails",
+        counters=("hits", "misses", "origin_fetches", "evictions"),
+    )
+    lines += render_stats(
+        "compression", compression_stats.snapshot(), "Response compression",
+        counters=("responses", "bytes_in", "bytes_out", "bytes_saved", "variant_hits", "variant_misses"),
+    )
+    return Response(content="\n".join(lines) + "\n", media_type=PROMETHEUS_CONTENT_TYPE)
 
 
 app.include_router(api_router)
 
+@app.exception_handler(CatalogLoadTimeout)
+async def catalog_load_timeout(request: Request, exc: CatalogLoadTimeout):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Catalog read timed out"},
+        headers={"Retry-After": "1"},
+    )
+
+# GET routes whose responses depend only on the catalog contents and the URL.
+_CONDITIONAL_PREFIXES = ("/api/countries", "/api/places", "/api/search", "/api/home", "/api/stats")
+# Single places under a country carry their own revision ETag.
+_CONDITIONAL_EXCLUDE = re.compile(r"/api/countries/[^/]+/places/[^/]+$")
+
+app.add_middleware(
+    ConditionalGetMiddleware,
+    tag_getter=lambda: catalog_cache.tag,
+    prefixes=_CONDITIONAL_PREFIXES,
+    cache_control=CATALOG_CACHE_CONTROL,
+    exclude=_CONDITIONAL_EXCLUDE,
+)
+
+compression_stats = CompressionStats()
+
+# Added last so it wraps ConditionalGetMiddleware and sees the final ETag.
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024')),
+    gzip_level=int(os.environ.get('GZIP_LEVEL', '6')),
+    brotli_quality=int(os.environ.get('BROTLI_QUALITY', '5')),
+    stats=compression_stats,
+)
+
+def _admission_class(method, path):
+    if not path.startswith("/api/") or path == "/api/metrics":
+        return None
+    if path == "/api/seed":
+        return "seed"
+    if method != "GET" and path.startswith("/api/countries/") and "/places/" in path:
+        return "write"
+    if path == "/api/itinerary" or path.startswith("/api/images/"):
+        return "heavy"
+    return "read"
+
+def _route_limit(name, concurrency, queue):
+    env = f"ADMISSION_{name.upper()}"
+    return RouteLimit(
+        concurrency=int(os.environ.get(f"{env}_CONCURRENCY", concurrency)),
+        queue=int(os.environ.get(f"{env}_QUEUE", queue)),
+        queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '2')),
+    )
+
+admission = AdmissionControl(
+    _admission_class,
+    limits={
+        "read": _route_limit("read", 64, 256),
+        "heavy": _route_limit("heavy", 8, 32),
+        # The seed rewrites the whole collection; run one at a time and
+        # turn away a pile-up rather than queueing it behind the lock.
+        "seed": _route_limit("seed", 1, 4),
+        # Each place write ends in a catalog refresh on this worker.
+        "write": _route_limit("write", 4, 16),
+    },
+    rate=float(os.environ.get('RATE_LIMIT_RPS', '50')),
+    burst=float(os.environ.get('RATE_LIMIT_BURST', '100')),
+    trust_forwarded_for=os.environ.get('TRUST_X_FORWARDED_FOR', '').lower() in ('1', 'true', 'yes'),
+)
+
+# Inside CORS, so rejections still carry CORS headers the browser can read.
+app.add_middleware(AdmissionMiddleware, control=admission)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    # Readable from the cross-origin frontend (paging cursor, validators, back-off).
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After"],
 )
 
+request_metrics = RequestMetrics()
+
+# Outermost, so the timings include every other middleware.
+app.add_middleware(RequestTimingMiddleware, metrics=request_metrics, routes=app.routes)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await store.create_indexes()
+
+@app.on_event("startup")
+async def load_catalog():
+    await _refresh_catalog(await store.get_meta(), force=True)
+    if CATALOG_REFRESH_INTERVAL > 0:
+        app.state.catalog_watcher = asyncio.create_task(_watch_catalog())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    watcher = getattr(app.state, "catalog_watcher", None)
+    if watcher is not None:
+        watcher.cancel()
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+    store.close()
+    image_proxy.close()
\ No newline at end of file
@@ -0,0 +1,186 @@
+import zlib
+
+import numpy as np
+
+from facets import place_facets
+from search_index import tokenize
+
+
+# Description terms are hashed into a fixed number of columns so the matrix
+# width does not grow with the vocabulary.
+TERM_DIMS = 128
+
+# Relative weight of each feature block in the distance.
+FEATURE_WEIGHTS = {
+    "rating": 1.0,
+    "price": 1.0,
+    "duration": 0.5,
+    "location": 1.5,
+    "months": 1.0,
+    "terms": 1.5,
+}
+
+# Spliced-in rows are scaled with the statistics of the last full build;
+# once more than this share of the rows has been replaced, splicing
+# rebuilds instead.
+STATS_DRIFT = 0.05
+
+
+def _midpoints(low, high):
+    low = np.array([np.nan if v is None else v for v in low], dtype=np.float64)
+    high = np.array([np.nan if v is None else v for v in high], dtype=np.float64)
+    return (low + high) / 2
+
+
+def _moments(column):
+    valid = ~np.isnan(column)
+    if not valid.any():
+        return 0.0, 1.0
+    return column[valid].mean(), column[valid].std() or 1.0
+
+
+def _standardize(column, moments):
+    """Z-scores against ``moments``, with missing values at the mean (0)."""
+    mean, std = moments
+    out = (column - mean) / std
+    out[np.isnan(column)] = 0.0
+    return out
+
+
+def _unit_rows(block):
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return block / norms
+
+
+def _term_bucket(term):
+    return zlib.crc32(term.encode("utf-8")) % TERM_DIMS
+
+
+def _columns(places):
+    """Unscaled feature columns: rating, log price, log duration, location, months, terms."""
+    n = len(places)
+    facets = [place.get("facets") or place_facets(place) for place in places]
+
+    rating = np.array([np.nan if p.get("rating") is None else p["rating"] for p in places], dtype=np.float64)
+    price = _midpoints([f["price_min"] for f in facets], [f["price_max"] for f in facets])
+    days = _midpoints([f["days_min"] for f in facets], [f["days_max"] for f in facets])
+
+    coords = np.array([
+        (loc.get("lat"), loc.get("lng")) if loc.get("lat") is not None and loc.get("lng") is not None
+        else (np.nan, np.nan)
+        for loc in (place.get("location") or {} for place in places)
+    ], dtype=np.float64).reshape(n, 2)
+    lat, lng = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    location = np.column_stack((np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)))
+    location[np.isnan(location)] = 0.0
+
+    months = np.array([f["months"] for f in facets], dtype=np.uint16).reshape(n)
+    months = ((months[:, None] >> np.arange(12, dtype=np.uint16)) & 1).astype(np.float64)
+
+    terms = np.zeros((n, TERM_DIMS))
+    for i, place in enumerate(places):
+        buckets = {_term_bucket(t) for t in tokenize(f"{place.get('name', '')} {place.get('description', '')}")}
+        terms[i, list(buckets)] = 1.0
+    return rating, np.log1p(price), np.log1p(days), location, months, terms
+
+
+class SimilarityIndex:
+    """Feature matrix over every place for "more like this" lookups.
+
+    Each place becomes one row of weighted feature blocks:
+
+    * rating, log price and log duration as z-scores;
+    * location as a point on the unit sphere;
+    * best-time months as a unit vector over the 12 months;
+    * description and name terms as hashed, IDF-weighted unit vectors.
+
+    Similarity is the Euclidean distance between rows. A query is one
+    matrix-vector product against precomputed row norms plus an
+    ``argpartition``, so it stays fast for 100k places.
+    """
+
+    def __init__(self, rows):
+        """``rows`` is a list of ``(country_id, place)`` pairs."""
+        self.rows = rows
+        self._positions = {place["id"]: i for i, (_, place) in enumerate(rows)}
+        columns = _columns([place for _, place in rows])
+        rating, price, duration, _, _, terms = columns
+        self._moments = {"rating": _moments(rating), "price": _moments(price), "duration": _moments(duration)}
+        n = len(rows)
+        self._idf = np.log((n + 1) / (terms.sum(axis=0) + 1)) + 1.0
+        self._replaced = 0
+        self.matrix = self._matrix(*columns)
+        self._sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+
+    def _matrix(self, rating, price, duration, location, months, terms):
+        blocks = {
+            "rating": _standardize(rating, self._moments["rating"])[:, None],
+            "price": _standardize(price, self._moments["price"])[:, None],
+            "duration": _standardize(duration, self._moments["duration"])[:, None],
+            "location": location,
+            "months": _unit_rows(months),
+            "terms": _unit_rows(terms * self._idf),
+        }
+        return np.hstack([
+            blocks[name] * np.sqrt(weight) for name, weight in FEATURE_WEIGHTS.items()
+        ]).astype(np.float32)
+
+    def spliced(self, start, end, rows):
+        """A copy with ``self.rows[start:end]`` replaced by ``rows``.
+
+        Rows whose place is unchanged keep their features; new ones are
+        scaled with this index's statistics, until the rows spliced in and
+        out that way exceed ``STATS_DRIFT`` of the index and the copy is
+        built afresh.
+        """
+        rows = list(rows)
+        spliced = self.rows[:start] + rows + self.rows[end:]
+        old = {place["id"]: (i, place) for i, (_, place) in enumerate(self.rows[start:end], start)}
+        reused = [old.get(place["id"], (None, None)) for _, place in rows]
+        reused = [i if i is not None and previous == place else None
+                  for (i, previous), (_, place) in zip(reused, rows)]
+        changed = [j for j, i in enumerate(reused) if i is None]
+        replaced = self._replaced + len(changed) + (end - start) - (len(rows) - len(changed))
+        if replaced > STATS_DRIFT * len(spliced):
+            return SimilarityIndex(spliced)
+
+        index = SimilarityIndex.__new__(SimilarityIndex)
+        index.rows = spliced
+        index._positions = {place["id"]: i for i, (_, place) in enumerate(spliced)}
+        index._moments, index._idf, index._replaced = self._moments, self._idf, replaced
+        middle = np.empty((len(rows), self.matrix.shape[1]), dtype=self.matrix.dtype)
+        kept = [j for j, i in enumerate(reused) if i is not None]
+        middle[kept] = self.matrix[[reused[j] for j in kept]]
+        if changed:
+            middle[changed] = index._matrix(*_columns([rows[j][1] for j in changed]))
+        index.matrix = np.concatenate((self.matrix[:start], middle, self.matrix[end:]))
+        index._sq_norms = np.concatenate((
+            self._sq_norms[:start], np.einsum("ij,ij->i", middle, middle), self._sq_norms[end:]
+        ))
+        return index
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, place_id):
+        return place_id in self._positions
+
+    def similar(self, place_id, k):
+        """Return up to ``k`` ``(country_id, place, score)`` triples, most similar first.
+
+        ``score`` is ``1 / (1 + distance)``, so 1.0 means identical features.
+        """
+        i = self._positions.get(place_id)
+        if i is None:
+            return []
+        vector = self.matrix[i]
+        distances = self._sq_norms - 2 * (self.matrix @ vector) + self._sq_norms[i]
+        distances[i] = np.inf
+        k = min(k, len(self.rows) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind="stable")]
+        scores = 1.0 / (1.0 + np.sqrt(np.maximum(distances[top], 0.0)))
+        return [(*self.rows[j], float(score)) for j, score in zip(top, scores)]
@@ -0,0 +1,37 @@
+"""Export the MongoDB catalog to a read-only SQLite snapshot.
+
+    python snapshot.py catalog.sqlite
+
+Serve the file with ``CATALOG_SNAPSHOT=catalog.sqlite uvicorn server:app``.
+Those replicas need no MongoDB connection, report the same catalog tag (and
+so the same ETags) as the database the snapshot came from, and reject
+``/api/seed``. Re-export and restart them to pick up catalog changes.
+"""
+import argparse
+import asyncio
+import sys
+
+from storage import write_snapshot
+
+
+async def export(path):
+    import server
+
+    if server.store.read_only:
+        sys.exit("CATALOG_SNAPSHOT is set; unset it to export from MongoDB")
+    countries = await server.store.list_countries()
+    meta = await server.store.get_meta()
+    write_snapshot(path, countries, meta)
+    places = sum(len(c.get('places', [])) for c in countries)
+    print(f"wrote {len(countries)} countries, {places} places to {path}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the catalog to a SQLite snapshot.")
+    parser.add_argument("path")
+    args = parser.parse_args()
+    asyncio.run(export(args.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""Catalog storage backends.
+
+Every catalog read and write in ``server.py`` goes through a store:
+
+* ``MongoCatalogStore`` reads and writes the ``countries``,
+  ``catalog_meta`` and ``catalog_stats`` collections through Motor.
+* ``SnapshotCatalogStore`` serves a read-only SQLite file written by
+  ``write_snapshot`` (see ``snapshot.py``). It needs no database server, so
+  read replicas can start straight from the file.
+
+Field selections are frozensets of paths as produced by
+``server._parse_fields`` (``None`` for whole documents). Place rows are
+``{"country_id", "pos", "place"}`` dicts, where ``pos`` is the place's
+index in its country's ``places`` array; countries are ordered by id and
+places by ``(country_id, pos)``, which is what the paging cursors encode.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+import catalog_stats
+
+
+class ReadOnlyCatalog(Exception):
+    """Raised by write methods of a store that serves a snapshot."""
+
+
+def mongo_projection(selected):
+    projection = {"_id": 0}
+    if selected:
+        projection.update((path, 1) for path in selected)
+    return projection
+
+
+def project(doc, selected):
+    """Apply a field selection to a document, the way a Mongo projection would."""
+    if not selected:
+        return doc
+    nested = {}
+    out = {}
+    for path in selected:
+        name, _, sub = path.partition('.')
+        if sub:
+            nested.setdefault(name, []).append(sub)
+        elif name in doc:
+            out[name] = doc[name]
+    for name, subs in nested.items():
+        if isinstance(doc.get(name), list):
+            out[name] = [{k: item[k] for k in subs if k in item} for item in doc[name]]
+    return out
+
+
+# Place ids are unique across the whole catalog. Countries without places
+# are left out, as they would all share the index key of an empty array.
+PLACE_ID_INDEX = {
+    "name": "places_id_unique",
+    "unique": True,
+    "partialFilterExpression": {"places.id": {"$exists": True}},
+}
+
+
+def _rev_match(rev):
+    # Places written before revisions existed have no "rev" field; they are
+    # at revision 0.
+    return {"$in": [0, None]} if rev == 0 else rev
+
+
+class MongoCatalogStore:
+    read_only = False
+
+    def __init__(self, db):
+        self.db = db
+
+    def _countries_cursor(self, after, selected):
+        # Paged and streamed reads are ordered by id, which the id index serves.
+        query = {"id": {"$gt": after}} if after is not None else {}
+        return self.db.countries.find(query, mongo_projection(selected)).sort("id", 1)
+
+    def _places_pipeline(self, after, selected):
+        # Countries are walked in id order and places in array order, so the
+        # (country id, array position) pair is a stable cursor without a
+        # blocking sort over the unwound places.
+        pipeline = [{"$sort": {"id": 1}}]
+        if after is not None:
+            country_id, pos = after
+            pipeline.insert(0, {"$match": {"id": {"$gte": country_id}}})
+        pipeline.append({"$unwind": {"path": "$places", "includeArrayIndex": "pos"}})
+        if after is not None:
+            pipeline.append({"$match": {"$or": [{"id": {"$gt": country_id}}, {"pos": {"$gt": pos}}]}})
+        place = "$places"
+        if selected:
+            place = {name: f"$places.{name}" for name in selected}
+        pipeline.append({"$project": {"_id": 0, "country_id": "$id", "pos": 1, "place": place}})
+        return pipeline
+
+    async def list_countries(self, selected=None):
+        return await self.db.countries.find({}, mongo_projection(selected)).to_list(None)
+
+    def stream_countries(self, after=None, limit=None, selected=None):
+        cursor = self._countries_cursor(after, selected)
+        return cursor.limit(limit) if limit is not None else cursor
+
+    async def countries_page(self, after, limit, selected=None):
+        return await self._countries_cursor(after, selected).limit(limit).to_list(None)
+
+    async def get_country(self, country_id, selected=None):
+        return await self.db.countries.find_one({"id": country_id}, mongo_projection(selected))
+
+    async def get_countries(self, ids, selected=None):
+        return await self.db.countries.find({"id": {"$in": ids}}, mongo_projection(selected)).to_list(None)
+
+    def stream_places(self, after=None, limit=None, selected=None):
+        pipeline = self._places_pipeline(after, selected)
+        if limit is not None:
+            pipeline.append({"$limit": limit})
+        return self.db.countries.aggregate(pipeline)
+
+    async def places_page(self, after, limit, selected=None):
+        return await self.stream_places(after, limit, selected).to_list(None)
+
+    async def list_places(self, selected=None):
+        return [row['place'] for row in await self.stream_places(selected=selected).to_list(None)]
+
+    async def get_place(self, place_id):
+        # Served by the multikey index on places.id; $elemMatch trims the
+        # embedded array down to the single matching place.
+        country = await self.db.countries.find_one(
+            {"places.id": place_id},
+            {"_id": 0, "places": {"$elemMatch": {"id": place_id}}}
+        )
+        if not country or not country.get('places'):
+            return None
+        return country['places'][0]
+
+    async def get_country_place(self, country_id, place_id):
+        country = await self.db.countries.find_one(
+            {"id": country_id, "places.id": place_id},
+            {"_id": 0, "places": {"$elemMatch": {"id": place_id}}}
+        )
+        return country['places'][0] if country and country.get('places') else None
+
+    async def insert_place(self, country_id, place):
+        """Append ``place`` to a country if no place has its id yet; returns whether it did.
+
+        The filter guards against the id within the country, the unique
+        index on ``places.id`` against it anywhere else, so two concurrent
+        inserts of one id cannot both succeed.
+        """
+        try:
+            result = await self.db.countries.update_one(
+                {"id": country_id, "places.id": {"$ne": place["id"]}},
+                {"$push": {"places": place}}
+            )
+        except DuplicateKeyError:
+            return False
+        return result.modified_count == 1
+
+    async def update_place(self, country_id, place_id, rev, fields):
+        """Set ``fields`` on a place still at revision ``rev`` and bump the revision.
+
+        Only the named fields of the one matching array element are written.
+        Returns False when the place is gone or has moved past ``rev``.
+        """
+        # The positional "$" is the element the $elemMatch selected.
+        updates = {f"places.$.{name}": value for name, value in fields.items()}
+        result = await self.db.countries.update_one(
+            {"id": country_id, "places": {"$elemMatch": {"id": place_id, "rev": _rev_match(rev)}}},
+            {"$set": updates, "$inc": {"places.$.rev": 1}}
+        )
+        return result.modified_count == 1
+
+    async def delete_place(self, country_id, place_id, rev):
+        """Remove a place still at revision ``rev``; returns whether it did."""
+        result = await self.db.countries.update_one(
+            {"id": country_id, "places": {"$elemMatch": {"id": place_id, "rev": _rev_match(rev)}}},
+            {"$pull": {"places": {"id": place_id}}}
+        )
+        return result.modified_count == 1
+
+    async def get_places(self, ids):
+        # One query: the multikey places.id index finds the countries holding
+        # any of the ids, then only the matching places are unwound.
+        rows = await self.db.countries.aggregate([
+            {"$match": {"places.id": {"$in": ids}}},
+            {"$unwind": "$places"},
+            {"$match": {"places.id": {"$in": ids}}},
+            {"$project": {"_id": 0, "place": "$places"}},
+        ]).to_list(None)
+        return [row['place'] for row in rows]
+
+    async def count_countries(self):
+        return await self.db.countries.count_documents({})
+
+    async def get_meta(self):
+        return await self.db.catalog_meta.find_one({"_id": "catalog"})
+
+    async def update_meta(self, fields):
+        """Set ``fields`` on the catalog meta document and bump its ``version``.
+
+        Every write path calls this, so ``version`` orders catalog changes
+        across workers. Returns the updated document.
+        """
+        return await self.db.catalog_meta.find_one_and_update(
+            {"_id": "catalog"},
+            {"$set": fields, "$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def watch_meta(self, interval):
+        """Yield the catalog meta document now, on every change, and at least every ``interval`` seconds.
+
+        Changes arrive through a change stream where the deployment has one
+        (replica sets, sharded clusters). Standalone servers, and quiet
+        streams, fall back to a read every ``interval`` seconds, which
+        bounds how long a missed notification can go unnoticed.
+        """
+        yield await self.get_meta()
+        try:
+            async with self.db.catalog_meta.watch(
+                [{"$match": {"documentKey._id": "catalog"}}],
+                max_await_time_ms=int(interval * 1000),
+            ) as stream:
+                while stream.alive:
+                    await stream.try_next()
+                    yield await self.get_meta()
+        except (OperationFailure, NotImplementedError):
+            pass
+        while True:
+            await asyncio.sleep(interval)
+            yield await self.get_meta()
+
+    async def get_stats(self, country_id):
+        return await self.db.catalog_stats.find_one({"_id": country_id})
+
+    async def list_stats(self):
+        return await self.db.catalog_stats.find({}).sort("_id", 1).to_list(None)
+
+    async def inc_stats(self, country_id, delta):
+        """Apply a ``catalog_stats.counters_delta`` to one country's summary."""
+        if delta:
+            await self.db.catalog_stats.update_one({"_id": country_id}, {"$inc": delta}, upsert=True)
+
+    async def replace_stats(self, summaries):
+        if not summaries:
+            await self.db.catalog_stats.drop()
+            return
+        staging = self.db[f"catalog_stats_staging_{uuid.uuid4().hex}"]
+        try:
+            await staging.insert_many(summaries)
+            await staging.rename("catalog_stats", dropTarget=True)
+        except Exception:
+            await staging.drop()
+            raise
+
+    async def replace_catalog(self, countries):
+        # Build the new catalog off to the side and rename it over the live
+        # collection, so readers see either the old or the new catalog and
+        # never an empty or partially written one.
+        staging = self.db[f"countries_staging_{uuid.uuid4().hex}"]
+        try:
+            await staging.create_index("id")
+            await staging.create_index("places.id", **PLACE_ID_INDEX)
+            await staging.insert_many(countries)
+            await staging.rename("countries", dropTarget=True)
+        except Exception:
+            await staging.drop()
+            raise
+
+    async def create_indexes(self):
+        await self.db.countries.create_index("id")
+        # Superseded by the unique index, which serves the same lookups.
+        if "places.id_1" in await self.db.countries.index_information():
+            await self.db.countries.drop_index("places.id_1")
+        await self.db.countries.create_index("places.id", **PLACE_ID_INDEX)
+
+    def close(self):
+        self.db.client.close()
+
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE countries (id TEXT PRIMARY KEY, doc TEXT NOT NULL);
+CREATE TABLE places (
+    country_id TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    doc TEXT NOT NULL,
+    PRIMARY KEY (country_id, pos)
+);
+CREATE INDEX places_id ON places (id);
+"""
+
+
+def write_snapshot(path, countries, meta):
+    """Write ``countries`` and the catalog ``meta`` to a SQLite snapshot at ``path``.
+
+    The file is built next to ``path`` and renamed over it, so a replica
+    opening ``path`` never sees a partial snapshot.
+    """
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(_SCHEMA)
+        meta = {k: v for k, v in (meta or {}).items() if k != "_id"}
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [(k, json.dumps(v, default=str)) for k, v in meta.items()]
+        )
+        for country in countries:
+            conn.execute("INSERT INTO countries VALUES (?, ?)", (country['id'], json.dumps(country)))
+            conn.executemany("INSERT INTO places VALUES (?, ?, ?, ?)", [
+                (country['id'], pos, place['id'], json.dumps(place))
+                for pos, place in enumerate(country.get('places', []))
+            ])
+        conn.commit()
+    except Exception:
+        conn.close()
+        os.unlink(tmp)
+        raise
+    conn.close()
+    os.replace(tmp, path)
+
+
+class SnapshotCatalogStore:
+    """Read-only store over a SQLite snapshot written by ``write_snapshot``.
+
+    Queries are small indexed reads; they run on worker threads so a large
+    full-catalog read does not stall the event loop. The file is opened
+    immutable, which skips SQLite's locking entirely.
+    """
+
+    read_only = True
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(
+            f"file:{os.path.abspath(path)}?mode=ro&immutable=1", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self._stats = None
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def _fetch(self, sql, params=()):
+        return await asyncio.to_thread(self._query, sql, params)
+
+    async def _countries(self, sql, params, selected):
+        return [project(json.loads(doc), selected) for (doc,) in await self._fetch(sql, params)]
+
+    async def _places(self, sql, params, selected):
+        return [
+            {"country_id": country_id, "pos": pos, "place": project(json.loads(doc), selected)}
+            for country_id, pos, doc in await self._fetch(sql, params)
+        ]
+
+    def _places_query(self, after, limit):
+        sql, params = "SELECT country_id, pos, doc FROM places", []
+        if after is not None:
+            sql += " WHERE (country_id, pos) > (?, ?)"
+            params += list(after)
+        sql += " ORDER BY country_id, pos"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    async def list_countries(self, selected=None):
+        # Export order, matching the natural order of the source collection.
+        return await self._countries("SELECT doc FROM countries ORDER BY rowid", (), selected)
+
+    async def stream_countries(self, after=None, limit=None, selected=None):
+        for doc in await self.countries_page(after, limit if limit is not None else -1, selected):
+            yield doc
+
+    async def countries_page(self, after, limit, selected=None):
+        return await self._countries(
+            "SELECT doc FROM countries WHERE id > ? ORDER BY id LIMIT ?",
+            ("" if after is None else after, limit), selected
+        )
+
+    async def get_country(self, country_id, selected=None):
+        docs = await self._countries("SELECT doc FROM countries WHERE id = ?", (country_id,), selected)
+        return docs[0] if docs else None
+
+    async def get_countries(self, ids, selected=None):
+        marks = ",".join("?" * len(ids))
+        return await self._countries(f"SELECT doc FROM countries WHERE id IN ({marks})", ids, selected)
+
+    async def stream_places(self, after=None, limit=None, selected=None):
+        for row in await self.places_page(after, limit, selected):
+            yield row
+
+    async def places_page(self, after, limit, selected=None):
+        sql, params = self._places_query(after, limit)
+        return await self._places(sql, params, selected)
+
+    async def list_places(self, selected=None):
+        return [row['place'] for row in await self.places_page(None, None, selected)]
+
+    async def get_place(self, place_id):
+        rows = await self._fetch("SELECT doc FROM places WHERE id = ? LIMIT 1", (place_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    async def get_country_place(self, country_id, place_id):
+        rows = await self._fetch(
+            "SELECT doc FROM places WHERE country_id = ? AND id = ? LIMIT 1", (country_id, place_id)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    async def insert_place(self, country_id, place):
+        raise ReadOnlyCatalog(self.path)
+
+    async def update_place(self, country_id, place_id, rev, fields):
+        raise ReadOnlyCatalog(self.path)
+
+    async def delete_place(self, country_id, place_id, rev):
+        raise ReadOnlyCatalog(self.path)
+
+    async def get_places(self, ids):
+        marks = ",".join("?" * len(ids))
+        rows = await self._fetch(f"SELECT doc FROM places WHERE id IN ({marks})", ids)
+        return [json.loads(doc) for (doc,) in rows]
+
+    async def count_countries(self):
+        return (await self._fetch("SELECT COUNT(*) FROM countries"))[0][0]
+
+    async def get_meta(self):
+        rows = await self._fetch("SELECT key, value FROM meta")
+        return {"_id": "catalog", **{k: json.loads(v) for k, v in rows}} if rows else None
+
+    async def update_meta(self, fields):
+        raise ReadOnlyCatalog(self.path)
+
+    async def watch_meta(self, interval):
+        # A snapshot never changes under a running replica.
+        yield await self.get_meta()
+
+    async def _summaries(self):
+        # The file never changes, so the summaries are computed once.
+        if self._stats is None:
+            summaries = catalog_stats.build(await self.list_countries())
+            self._stats = {summary["_id"]: summary for summary in summaries}
+        return self._stats
+
+    async def get_stats(self, country_id):
+        return (await self._summaries()).get(country_id)
+
+    async def list_stats(self):
+        return [summary for _, summary in sorted((await self._summaries()).items())]
+
+    async def inc_stats(self, country_id, delta):
+        raise ReadOnlyCatalog(self.path)
+
+    async def replace_stats(self, summaries):
+        raise ReadOnlyCatalog(self.path)
+
+    async def replace_catalog(self, countries):
+        raise ReadOnlyCatalog(self.path)
+
+    async def create_indexes(self):
+        pass
+
+    def close(self):
+        self._conn.close()
@@ -176,6 +176,21 @@ class TravelAPITester:
                 return False
         return False
 
+    def test_search_endpoint(self):
+        """Test search endpoint"""
+        success, response = self.run_test(
+            "Search Places (kyoto)",
+            "GET",
+            "search?q=kyoto",
+            200
+        )
+        if success and isinstance(response, list) and response:
+            top = response[0]
+            print(f"✅ Top hit: {top.get('name')} ({top.get('kind')}, score {top.get('score')})")
+            return top.get('id') == 'kyoto-bamboo'
+        print("⚠️  No search results for 'kyoto'")
+        return False
+
     def test_invalid_endpoints(self):
         """Test invalid endpoints return 404"""
         success, _ = self.run_test(
@@ -219,7 +234,10 @@ def main():
     # 5. Test get specific place
     test_results.append(("Get Specific Place", tester.test_get_specific_place()))
     
-    # 6. Test invalid endpoints
+    # 6. Test search
+    test_results.append(("Search", tester.test_search_endpoint()))
+    
+    # 7. Test invalid endpoints
     test_results.append(("Invalid Endpoints", tester.test_invalid_endpoints()))
     
     # Print results summary
@@ -0,0 +1,263 @@
+"""Concurrent load test for the catalog API against a synthetic catalog.
+
+Drives the FastAPI app in-process through ``httpx.ASGITransport``, so the
+numbers cover routing, middleware, caching, serialization and the database
+driver without any socket or proxy noise. The database is either the
+MongoDB instance in ``MONGO_URL`` (a throwaway ``<DB_NAME>_load`` database,
+dropped afterwards) or, with ``--mock``, an in-memory ``mongomock_motor``
+client.
+
+For each catalog size and endpoint, ``--concurrency`` workers issue
+requests for ``--duration`` seconds. The report gives the first (cold cache)
+request, p50/p95/p99 latency, throughput, errors and process memory
+(``--trace-memory`` adds the Python heap peak, at some cost in latency).
+Results are written as JSON to ``--output``; pass a previous file as
+``--baseline`` to print p95 and throughput changes against it.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/load_test.py --mock --sizes 10 1000 100000
+    python benchmarks/load_test.py --endpoints place search --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'backend'))
+
+
+def _percentile(samples, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return None
+    rank = max(1, int(round(q / 100 * len(samples))))
+    return samples[min(rank, len(samples)) - 1]
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        # No procfs: fall back to the peak, reported in KiB on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def endpoints(catalog):
+    """Name -> function returning a random request path for that endpoint."""
+    countries = [c['id'] for c in catalog]
+    places = [(p['id'], p['name'], p['location']) for c in catalog for p in c['places']]
+
+    def nearby():
+        _, _, loc = random.choice(places)
+        return f"/api/places/nearby?lat={loc['lat']:.4f}&lng={loc['lng']:.4f}&radius_km=500"
+
+    return {
+        'countries': lambda: '/api/countries',
+        'countries_page': lambda: '/api/countries?limit=50',
+        'country': lambda: f'/api/countries/{random.choice(countries)}',
+        'places_page': lambda: '/api/places?limit=100',
+        'place': lambda: f'/api/places/{random.choice(places)[0]}',
+        'place_fields': lambda: f'/api/places/{random.choice(places)[0]}?fields=name,image',
+        'facets': lambda: '/api/places?min_rating=4.5&month=4&max_days=3',
+        'nearby': nearby,
+        'search': lambda: f'/api/search?q={random.choice(places)[1].split()[-1]}',
+        'home': lambda: '/api/home',
+    }
+
+
+async def drive(client, make_path, concurrency, duration, max_requests):
+    latencies, statuses = [], {}
+    errors = 0
+    deadline = time.perf_counter() + duration
+    issued = 0
+
+    async def worker():
+        nonlocal errors, issued
+        while time.perf_counter() < deadline and (not max_requests or issued < max_requests):
+            issued += 1
+            path = make_path()
+            start = time.perf_counter()
+            try:
+                response = await client.get(path, headers={'Accept-Encoding': 'gzip'})
+                await response.aread()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'max_ms': latencies[-1] if latencies else None,
+    }
+
+
+async def load_catalog(server, db, size):
+    from facets import normalize_catalog
+    from place_lookup import make_catalog
+
+    await db.countries.drop()
+    # Indexes first, as replace_catalog does: mongomock cannot build the
+    # unique places.id index over documents that are already there.
+    await server.create_indexes()
+    catalog = normalize_catalog(make_catalog(size, places_per_country=min(size, 50)))
+    for start in range(0, len(catalog), 100):
+        await db.countries.insert_many([dict(c) for c in catalog[start:start + 100]])
+    server.catalog_cache.bump(tag=f"load-{size}-{time.time_ns()}")
+    return catalog
+
+
+async def run(args):
+    # Imported here so --mock can patch the Motor client first.
+    import httpx
+    import server
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    db = server.client[os.environ['DB_NAME'] + '_load']
+    server.db = db
+    server.store = server.MongoCatalogStore(db)
+    # Every request comes from one in-process client; per-client rate
+    # limiting would measure the limiter, not the API.
+    server.admission.rate = 0
+    transport = httpx.ASGITransport(app=server.app)
+    results = []
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            for size in args.sizes:
+                random.seed(size)
+                if args.trace_memory:
+                    tracemalloc.start()
+                catalog = await load_catalog(server, db, size)
+                routes = endpoints(catalog)
+                for name in args.endpoints or routes:
+                    make_path = routes[name]
+                    # Start every endpoint from an empty cache so the first
+                    # request shows the cold cost and the rest the warm one.
+                    server.catalog_cache.bump()
+                    start = time.perf_counter()
+                    first = await client.get(make_path())
+                    first_ms = (time.perf_counter() - start) * 1000
+                    if args.trace_memory:
+                        tracemalloc.reset_peak()
+
+                    result = await drive(client, make_path, args.concurrency, args.duration, args.requests)
+                    peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+                    result.update({
+                        'size': size,
+                        'endpoint': name,
+                        'concurrency': args.concurrency,
+                        'first_status': first.status_code,
+                        'first_ms': first_ms,
+                        'rss_mb': round(_rss_mb(), 1),
+                        'py_peak_mb': round(peak / 2 ** 20, 2) if peak is not None else None,
+                    })
+                    results.append(result)
+                    print(_format_row(result), file=sys.stderr)
+                if args.trace_memory:
+                    tracemalloc.stop()
+    finally:
+        await server.client.drop_database(db.name)
+    return results
+
+
+def _format_row(r):
+    fmt = lambda v: f"{v:9.2f}" if v is not None else f"{'-':>9}"  # noqa: E731
+    return (f"{r['size']:>7} {r['endpoint']:<15} {fmt(r['first_ms'])} {fmt(r['p50_ms'])} "
+            f"{fmt(r['p95_ms'])} {fmt(r['p99_ms'])} {r['throughput_rps'] or 0:>9.1f} "
+            f"{r['errors']:>6} {r['rss_mb']:>8.1f}")
+
+
+HEADER = (f"{'places':>7} {'endpoint':<15} {'first ms':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'req/s':>9} {'errors':>6} {'rss MB':>8}")
+
+
+def compare(results, baseline_path):
+    baseline = {
+        (r['size'], r['endpoint']): r
+        for r in json.loads(Path(baseline_path).read_text())['results']
+    }
+    print(f"\n{'places':>7} {'endpoint':<15} {'p95 change':>11} {'req/s change':>13}")
+    for r in results:
+        old = baseline.get((r['size'], r['endpoint']))
+        if not old or not old['p95_ms'] or not old['throughput_rps']:
+            continue
+        p95 = (r['p95_ms'] / old['p95_ms'] - 1) * 100
+        rps = (r['throughput_rps'] / old['throughput_rps'] - 1) * 100
+        print(f"{r['size']:>7} {r['endpoint']:<15} {p95:>+10.1f}% {rps:>+12.1f}%")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--endpoints', nargs='+', help='subset of endpoints to drive (default: all)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per endpoint and size')
+    parser.add_argument('--requests', type=int, default=0, help='stop each run after this many requests')
+    parser.add_argument('--mock', action='store_true', help='use an in-memory mongomock_motor client')
+    parser.add_argument('--trace-memory', action='store_true', help='record the Python heap peak per run')
+    parser.add_argument('--output', default='load_test_results.json')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    args = parser.parse_args()
+
+    if args.mock:
+        try:
+            import mongomock_motor
+        except ImportError:
+            parser.error('--mock needs the mongomock-motor package')
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+        os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+        os.environ.setdefault('DB_NAME', 'bench')
+
+    print(HEADER, file=sys.stderr)
+    results = asyncio.run(run(args))
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': 'mongomock' if args.mock else 'mongodb',
+        'args': vars(args),
+        'results': results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"wrote {args.output}", file=sys.stderr)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
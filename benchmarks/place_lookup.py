@@ -0,0 +1,115 @@
+"""Benchmark GET /api/places/{place_id} lookups against a synthetic catalog.
+
+Compares the old full-collection scan with the indexed ``places.id`` lookup
+behind ``server.get_place`` at several catalog sizes. Runs against the
+MongoDB instance in ``MONGO_URL`` using a throwaway ``<DB_NAME>_bench``
+database, which is dropped afterwards.
+
+    python benchmarks/place_lookup.py --sizes 1000 10000 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import server  # noqa: E402
+
+
+def make_catalog(total_places, places_per_country=50):
+    countries = []
+    n_countries = max(1, total_places // places_per_country)
+    for c in range(n_countries):
+        places = []
+        for p in range(places_per_country):
+            places.append({
+                "id": f"place-{c}-{p}",
+                "name": f"Place {c}-{p}",
+                "description": "Synthetic benchmark place " * 4,
+                "image": f"https://images.example.com/{c}/{p}.jpg?w=800",
+                "price": "$1,000 - $2,000",
+                "rating": 4.5,
+                "location": {"lat": random.uniform(-60, 60), "lng": random.uniform(-180, 180)},
+                "best_time": "March to May",
+                "duration": "2-3 days"
+            })
+        countries.append({
+            "id": f"country-{c}",
+            "name": f"Country {c}",
+            "description": "Synthetic benchmark country",
+            "hero_image": f"https://images.example.com/{c}/hero.jpg",
+            "places": places
+        })
+    return countries
+
+
+async def scan_lookup(db, place_id):
+    """The pre-index implementation: load every country and walk the places.
+
+    The original read ``to_list(100)``, which silently missed every place
+    past the first 100 countries (5,000 places here). This scans the whole
+    collection, which is what a correct scan costs.
+    """
+    countries = await db.countries.find({}, {"_id": 0}).to_list(None)
+    for country in countries:
+        for place in country.get('places', []):
+            if place['id'] == place_id:
+                return place
+    return None
+
+
+async def timed(fn, ids, repeat):
+    samples = []
+    for _ in range(repeat):
+        place_id = random.choice(ids)
+        start = time.perf_counter()
+        await fn(place_id)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[int(len(samples) * 0.95) - 1],
+    }
+
+
+async def run(sizes, repeat):
+    db = server.client[os.environ['DB_NAME'] + '_bench']
+    server.db = db
+    server.store = server.MongoCatalogStore(db)
+    print(f"{'places':>8} {'scan p50':>10} {'scan p95':>10} {'index p50':>10} {'index p95':>10}  plan")
+    try:
+        for size in sizes:
+            await db.countries.drop()
+            catalog = make_catalog(size)
+            await db.countries.insert_many(catalog)
+            await server.create_indexes()
+            ids = [p['id'] for c in catalog for p in c['places']]
+
+            scan = await timed(lambda pid: scan_lookup(db, pid), ids, repeat)
+            indexed = await timed(server.store.get_place, ids, repeat)
+
+            explain = await db.countries.find({"places.id": ids[-1]}).explain()
+            stage = explain['queryPlanner']['winningPlan']
+            while 'inputStage' in stage:
+                stage = stage['inputStage']
+            print(f"{size:>8} {scan['p50']:>9.2f}ms {scan['p95']:>9.2f}ms "
+                  f"{indexed['p50']:>9.2f}ms {indexed['p95']:>9.2f}ms  {stage['stage']}")
+    finally:
+        await server.client.drop_database(db.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,9 @@ import { Toaster } from "sonner";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Resized, cached copy of a place image (or a country hero image).
+export const imageUrl = (id, width) => `${API}/images/${encodeURIComponent(id)}?w=${width}`;
+
 export const axiosInstance = axios.create({
   baseURL: API,
 });
@@ -2,7 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { motion } from 'framer-motion';
 import { MapPin, Star, Clock, Calendar, ArrowLeft } from 'lucide-react';
 import { Link, useParams } from 'react-router-dom';
-import { axiosInstance } from '../App';
+import { axiosInstance, imageUrl } from '../App';
 import { toast } from 'sonner';
 
 const CountryDetail = () => {
@@ -120,7 +120,7 @@ const CountryDetail = () => {
                   <div className="place-card-hover bg-card rounded-lg overflow-hidden shadow-sm">
                     <div className="relative aspect-[4/3]">
                       <img
-                        src={place.image}
+                        src={imageUrl(place.id, 640)}
                         alt={place.name}
                         className="w-full h-full object-cover"
                       />
@@ -2,24 +2,21 @@ import React, { useEffect, useState } from 'react';
 import { motion } from 'framer-motion';
 import { MapPin, Star, ArrowRight, Search } from 'lucide-react';
 import { Link } from 'react-router-dom';
-import { axiosInstance } from '../App';
+import { axiosInstance, imageUrl } from '../App';
 import { toast } from 'sonner';
 
 const Home = () => {
   const [countries, setCountries] = useState([]);
-  const [allPlaces, setAllPlaces] = useState([]);
+  const [trendingPlaces, setTrendingPlaces] = useState([]);
   const [searchQuery, setSearchQuery] = useState('');
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [countriesRes, placesRes] = await Promise.all([
-          axiosInstance.get('/countries'),
-          axiosInstance.get('/places')
-        ]);
-        setCountries(countriesRes.data);
-        setAllPlaces(placesRes.data);
+        const response = await axiosInstance.get('/home');
+        setCountries(response.data.countries);
+        setTrendingPlaces(response.data.trending);
         setLoading(false);
       } catch (error) {
         console.error('Error fetching data:', error);
@@ -30,8 +27,6 @@ const Home = () => {
     fetchData();
   }, []);
 
-  const trendingPlaces = allPlaces.slice(0, 6);
-
   if (loading) {
     return (
       <div className="min-h-screen flex items-center justify-center bg-background">
@@ -128,7 +123,7 @@ const Home = () => {
                 <Link to={`/country/${country.id}`} data-testid={`country-card-${country.id}`}>
                   <div className="country-card group relative h-[500px] w-full overflow-hidden rounded-lg cursor-pointer">
                     <img
-                      src={country.hero_image}
+                      src={imageUrl(country.id, 960)}
                       alt={country.name}
                       className="country-card-image absolute inset-0 w-full h-full object-cover"
                     />
@@ -184,7 +179,7 @@ const Home = () => {
                   <div className="place-card-hover bg-card rounded-lg overflow-hidden shadow-sm">
                     <div className="relative aspect-[4/3]">
                       <img
-                        src={place.image}
+                        src={imageUrl(place.id, 640)}
                         alt={place.name}
                         className="w-full h-full object-cover"
                       />
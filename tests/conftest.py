@@ -0,0 +1,31 @@
+"""Run the backend in-process against mongomock.
+
+``server`` connects at import time, so Motor is swapped for mongomock's
+client before anything imports it.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import motor.motor_asyncio
+import mongomock_motor
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_catalog")
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """A fresh, empty catalog behind ``server.app``, without rate limiting."""
+    asyncio.run(server.client.drop_database(server.db.name))
+    server.catalog_cache.bump()
+    server._catalog_version = None
+    server._pending_meta = server._refresh_task = None
+    server.admission.rate = 0
+    yield server
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+from admission import AdmissionControl, RouteLimit
+
+
+def _scope(path="/api/things"):
+    return {"type": "http", "method": "GET", "path": path, "headers": [], "client": ("10.0.0.1", 1234)}
+
+
+async def _call(control, app):
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await control.handle(app, _scope(), None, send)
+    return statuses[0]
+
+
+def _control(concurrency, queue, queue_timeout):
+    limit = RouteLimit(concurrency, queue, queue_timeout)
+    return AdmissionControl(lambda method, path: "read", {"read": limit}), limit
+
+
+def _app(delay, seen=None, limit=None):
+    async def app(scope, receive, send):
+        if seen is not None:
+            seen.append(limit.active + limit.waiting)
+        await asyncio.sleep(delay)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+    return app
+
+
+def test_full_queue_is_shed_immediately():
+    async def main():
+        control, _ = _control(concurrency=1, queue=1, queue_timeout=5)
+        app = _app(0.2)
+        started = time.monotonic()
+        statuses = await asyncio.gather(*(_call(control, app) for _ in range(4)))
+        return sorted(statuses), time.monotonic() - started, control.shed
+
+    statuses, elapsed, shed = asyncio.run(main())
+    assert statuses == [200, 200, 503, 503]
+    assert shed == {("read", "queue_full"): 2}
+    assert elapsed < 1.0
+
+
+def test_arrival_during_slot_handoff_is_queued():
+    # C arrives after A has released its slot but before the waiting B has
+    # woken up to take it. The slot is spoken for, so C must count against
+    # the queue (and be shed) rather than wait uncounted.
+    async def main():
+        control, _ = _control(concurrency=1, queue=1, queue_timeout=0.3)
+        fast = _app(0.0)
+        later = []
+
+        async def first(scope, receive, send):
+            await asyncio.sleep(0.05)
+            later.append(asyncio.get_running_loop().call_soon(
+                lambda: later.append(asyncio.ensure_future(_call(control, fast)))
+            ))
+            await fast(scope, receive, send)
+
+        a = asyncio.ensure_future(_call(control, first))
+        await asyncio.sleep(0.01)
+        b = asyncio.ensure_future(_call(control, fast))
+        statuses = await asyncio.gather(a, b)
+        return statuses, await later[1]
+
+    (a, b), c = asyncio.run(main())
+    assert (a, b, c) == (200, 200, 503)
+
+
+def test_arrivals_during_handoff_stay_bounded():
+    # Requests keep arriving while slots are handed from one request to the
+    # next; none may wait past the queue timeout or exceed the queue bound.
+    async def main():
+        control, limit = _control(concurrency=1, queue=1, queue_timeout=0.3)
+        seen = []
+        app = _app(0.1, seen, limit)
+
+        async def timed():
+            started = time.monotonic()
+            status = await _call(control, app)
+            return status, time.monotonic() - started
+
+        tasks = []
+        for _ in range(40):
+            tasks.append(asyncio.ensure_future(timed()))
+            await asyncio.sleep(0.02)
+        return await asyncio.gather(*tasks), seen
+
+    results, seen = asyncio.run(main())
+    assert max(elapsed for _, elapsed in results) < 0.3 + 0.1 + 0.2
+    assert {status for status, _ in results} == {200, 503}
+    assert max(seen) <= 2
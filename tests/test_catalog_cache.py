@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from catalog_cache import CatalogCache
+
+
+def test_preloaded_entries_outlive_ttl_and_eviction():
+    cache = CatalogCache(ttl=0.01, max_entries=2)
+    cache.bump(tag="a", preload={"countries": ["x"]})
+    for n in range(5):
+        cache.set(f"json:place:{n}", n)
+    time.sleep(0.02)
+    assert cache.get("countries") == ["x"]
+    assert cache.get("json:place:4") is None
+    cache.bump(tag="b")
+    assert cache.get("countries") is None
+
+
+def test_stale_meta_does_not_roll_back(app):
+    async def main():
+        newer = {"tag": "new", "version": 3}
+        older = {"tag": "old", "version": 2}
+        assert await app._refresh_catalog(newer)
+        assert not await app._refresh_catalog(older)
+        assert app.catalog_cache.tag == "new"
+        assert app._catalog_version == 3
+
+    asyncio.run(main())
+
+
+def test_discard_drops_entries_and_loads_in_flight():
+    async def main():
+        cache = CatalogCache()
+        cache.bump(tag="v1", preload={"countries": []})
+        cache.set("json:place:a", b"old")
+        release = asyncio.Event()
+
+        async def slow_load():
+            await release.wait()
+            return b"before the write"
+
+        pending = asyncio.ensure_future(cache.get_or_load("json:place:b", slow_load))
+        await asyncio.sleep(0)
+        cache.discard(lambda key: key.startswith("json:place:"))
+        release.set()
+        assert await pending == b"before the write"
+        assert cache.get("json:place:a") is None
+        assert cache.get("json:place:b") is None
+        assert cache.get("countries") == []
+        assert cache.tag not in (None, "v1")
+
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import httpx
+import pytest
+
+import compression
+from compression import CompressionMiddleware
+
+BODY = json.dumps([{"id": n, "name": "A place well worth compressing"} for n in range(100)]).encode()
+
+
+def _scope(method="GET", path="/api/things", query=b"", accept_encoding="gzip"):
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else []
+    return {"type": "http", "method": method, "path": path, "query_string": query, "headers": headers}
+
+
+def _app(chunks, status=200, headers=None, content_type=b"application/json"):
+    """An ASGI app sending ``chunks`` as its body, the last without ``more_body``."""
+    async def app(scope, receive, send):
+        sent = [(b"content-type", content_type)] + list(headers or [])
+        if len(chunks) == 1:
+            sent.append((b"content-length", str(len(chunks[0])).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": sent})
+        for n, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": n < len(chunks) - 1})
+    return app
+
+
+def _call(middleware, scope):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, None, send))
+    start, bodies = messages[0], messages[1:]
+    return start["status"], dict(start["headers"]), [m.get("body", b"") for m in bodies]
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, None),
+    ("identity", None),
+    ("gzip", b"gzip"),
+    ("GZIP;q=0.5", b"gzip"),
+    ("gzip;q=0", None),
+    ("br;q=0, gzip", b"gzip"),
+    ("deflate, br", b"br" if compression.brotli is not None else None),
+])
+def test_negotiation(accept_encoding, expected):
+    status, headers, bodies = _call(CompressionMiddleware(_app([BODY])), _scope(accept_encoding=accept_encoding))
+    assert status == 200
+    assert headers.get(b"content-encoding") == expected
+    body = b"".join(bodies)
+    if expected == b"gzip":
+        body = gzip.decompress(body)
+    elif expected == b"br":
+        body = compression.brotli.decompress(body)
+    assert body == BODY
+    if expected is not None:
+        assert headers[b"content-length"] == str(len(b"".join(bodies))).encode()
+        assert headers[b"vary"] == b"Accept-Encoding"
+
+
+def test_size_threshold():
+    middleware = CompressionMiddleware(_app([BODY]), minimum_size=len(BODY) + 1)
+    status, headers, bodies = _call(middleware, _scope())
+    assert b"content-encoding" not in headers
+    assert b"vary" not in headers
+    assert b"".join(bodies) == BODY
+
+    # Small chunks that only reach the threshold together are held back and
+    # compressed as one body.
+    middleware = CompressionMiddleware(_app([BODY[:500], BODY[500:]]), minimum_size=len(BODY))
+    _, headers, bodies = _call(middleware, _scope())
+    assert headers[b"content-encoding"] == b"gzip"
+    assert gzip.decompress(b"".join(bodies)) == BODY
+
+    # Non-text types and other statuses pass through as they are.
+    for app in (_app([BODY], content_type=b"image/jpeg"), _app([BODY], status=404)):
+        _, headers, bodies = _call(CompressionMiddleware(app), _scope())
+        assert b"content-encoding" not in headers
+        assert b"".join(bodies) == BODY
+
+
+def test_etags_are_weakened_with_the_encoding():
+    etag = [(b"etag", b'"v1"')]
+    _, headers, _ = _call(CompressionMiddleware(_app([BODY], headers=etag)), _scope())
+    assert headers[b"etag"] == b'W/"v1"'
+
+    # Uncompressed, the representation is the identity one.
+    _, headers, _ = _call(CompressionMiddleware(_app([b"{}"], headers=etag)), _scope())
+    assert headers[b"etag"] == b'"v1"'
+
+    # A 304 answers for the representation the client holds, which is the
+    # compressed one, so it names the same weak ETag and varies the same way.
+    status, headers, bodies = _call(CompressionMiddleware(_app([b""], status=304, headers=etag)), _scope())
+    assert status == 304
+    assert headers[b"etag"] == b'W/"v1"'
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert b"content-encoding" not in headers
+    assert bodies == [b""]
+
+
+def test_compressed_variants_are_reused_per_etag():
+    calls = []
+
+    def app(etag, body=BODY):
+        inner = _app([body], headers=[(b"etag", etag)])
+
+        async def counted(scope, receive, send):
+            calls.append(scope["path"])
+            await inner(scope, receive, send)
+        return counted
+
+    middleware = CompressionMiddleware(None)
+    compressed = []
+    for etag, scope in [
+        (b'"v1"', _scope()),
+        (b'"v1"', _scope()),
+        (b'"v1"', _scope(query=b"page=2")),
+        (b'"v2"', _scope()),
+        (b'"v1"', _scope(method="POST")),
+    ]:
+        middleware.app = app(etag)
+        compressed.append(b"".join(_call(middleware, scope)[2]))
+    assert middleware.stats.variant_misses == 3
+    assert middleware.stats.variant_hits == 1
+    assert compressed[0] is compressed[1]
+    assert len(calls) == 5
+
+    # A different body under a reused ETag on another method is never
+    # answered from the cache.
+    middleware.app = app(b'"v1"', b'{"other": true}' * 100)
+    body = b"".join(_call(middleware, _scope(method="PATCH"))[2])
+    assert gzip.decompress(body) == b'{"other": true}' * 100
+
+
+def test_streamed_ndjson_is_compressed_chunk_by_chunk():
+    lines = [json.dumps({"id": n, "name": "streamed " * 40}).encode() + b"\n" for n in range(4)]
+    middleware = CompressionMiddleware(_app(lines, content_type=b"application/x-ndjson"), minimum_size=len(lines[0]))
+    _, headers, bodies = _call(middleware, _scope())
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    assert len(bodies) == len(lines)
+
+    # Every chunk is flushed, so each record can be decoded as soon as it
+    # arrives.
+    decoder = zlib.decompressobj(31)
+    for line, body in zip(lines, bodies):
+        assert decoder.decompress(body) == line
+    assert decoder.eof
+    assert middleware.stats.bytes_in == sum(map(len, lines))
+
+
+def test_ndjson_endpoint_streams_compressed(app):
+    async def main():
+        await app.store.create_indexes()
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.post("/api/seed")).status_code == 200
+            plain = await client.get("/api/countries")
+            response = await client.get(
+                "/api/countries", params={"format": "ndjson"}, headers={"Accept-Encoding": "gzip"}
+            )
+            assert response.headers["content-encoding"] == "gzip"
+            assert response.headers["content-type"].startswith("application/x-ndjson")
+            streamed = [json.loads(line) for line in response.text.splitlines()]
+            assert sorted(c["id"] for c in streamed) == sorted(c["id"] for c in plain.json())
+
+    asyncio.run(main())
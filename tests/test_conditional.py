@@ -0,0 +1,23 @@
+import asyncio
+
+import httpx
+
+
+def test_wildcard_only_matches_existing_resources(app):
+    async def main():
+        await app.store.create_indexes()
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.post("/api/seed")).status_code == 200
+            headers = {"If-None-Match": "*"}
+            assert (await client.get("/api/places/nope", headers=headers)).status_code == 404
+            assert (await client.get("/api/countries/nope", headers=headers)).status_code == 404
+
+            response = await client.get("/api/places/goa", headers=headers)
+            assert response.status_code == 304
+            assert response.content == b""
+            etag = response.headers["etag"]
+            assert (await client.get("/api/places/goa", headers={"If-None-Match": etag})).status_code == 304
+            assert (await client.get("/api/places/goa", headers={"If-None-Match": '"other"'})).status_code == 200
+
+    asyncio.run(main())
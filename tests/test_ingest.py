@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import ingest
+
+
+def _catalog(path, countries=3, places=10):
+    lines = []
+    for c in range(countries):
+        lines.append({"id": f"c{c}", "name": f"Country {c}", "description": "d", "hero_image": "h"})
+    for c in range(countries):
+        for p in range(places):
+            lines.append({
+                "country_id": f"c{c}", "id": f"c{c}-p{p}", "name": f"Place {p}", "description": "d",
+                "image": "i", "price": "$100 - $200", "rating": 4.5, "location": {"lat": 1.0, "lng": 2.0},
+                "best_time": "May", "duration": "2 days",
+            })
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    return len(lines)
+
+
+class _FailingCollection:
+    """Delegates to the real collection, but the ``fail_on``-th bulk_write raises."""
+
+    def __init__(self, collection, fail_on):
+        self._collection = collection
+        self._fail_on = fail_on
+        self.calls = 0
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def bulk_write(self, ops, **kwargs):
+        self.calls += 1
+        if self.calls == self._fail_on:
+            raise BulkWriteError({"writeErrors": [{"index": 0, "code": 1, "errmsg": "boom"}]})
+        return await self._collection.bulk_write(ops, **kwargs)
+
+
+class _DuplicateIds:
+    """Delegates to the real collection, but inserting a place in ``ids`` fails as a duplicate key."""
+
+    def __init__(self, collection, ids):
+        self._collection = collection
+        self._ids = ids
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def bulk_write(self, ops, **kwargs):
+        duplicate = [
+            i for i, op in enumerate(ops)
+            if op._doc.get("$push", {}).get("places", {}).get("id") in self._ids
+        ]
+        if not duplicate:
+            return await self._collection.bulk_write(ops, **kwargs)
+        rest = [op for i, op in enumerate(ops) if i not in duplicate]
+        matched = (await self._collection.bulk_write(rest, **kwargs)).matched_count if rest else 0
+        raise BulkWriteError({
+            "writeErrors": [{"index": i, "code": 11000, "errmsg": "E11000 duplicate key"} for i in duplicate],
+            "nMatched": matched,
+        })
+
+
+class _Db:
+    def __init__(self, db, countries):
+        self._db = db
+        self.countries = countries
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+async def _place_count(server):
+    return sum(len(c["places"]) for c in await server.db.countries.find({}).to_list(None))
+
+
+def test_failed_batch_aborts_and_keeps_checkpoint(app, tmp_path, monkeypatch):
+    path = tmp_path / "catalog.jsonl"
+    total = _catalog(path)
+    failing = _FailingCollection(app.db.countries, fail_on=5)
+    monkeypatch.setattr(ingest, "db", _Db(app.db, failing))
+
+    run = ingest.Ingest(str(path), "jsonl", batch_size=5, concurrency=1, resume=False)
+    with pytest.raises(BulkWriteError):
+        asyncio.run(run.run())
+
+    checkpoint = tmp_path / "catalog.jsonl.checkpoint"
+    assert checkpoint.exists()
+    assert json.loads(checkpoint.read_text())["line"] < total
+    assert asyncio.run(app.store.get_meta()) is None
+
+    monkeypatch.setattr(ingest, "db", app.db)
+    resumed = ingest.Ingest(str(path), "jsonl", batch_size=5, concurrency=1, resume=True)
+    assert asyncio.run(resumed.run())
+    assert not checkpoint.exists()
+    assert asyncio.run(_place_count(app)) == 30
+    assert asyncio.run(app.store.get_meta())["source"] == "ingest"
+
+
+def test_failure_with_batches_in_flight_is_not_lost(app, tmp_path, monkeypatch):
+    path = tmp_path / "catalog.jsonl"
+    _catalog(path, countries=1, places=40)
+    monkeypatch.setattr(ingest, "db", _Db(app.db, _FailingCollection(app.db.countries, fail_on=4)))
+
+    run = ingest.Ingest(str(path), "jsonl", batch_size=5, concurrency=4, resume=False)
+    with pytest.raises(BulkWriteError):
+        asyncio.run(run.run())
+    assert (tmp_path / "catalog.jsonl.checkpoint").exists()
+
+
+def test_reingesting_a_place_bumps_its_revision(app, tmp_path, monkeypatch):
+    path = tmp_path / "catalog.jsonl"
+    _catalog(path, countries=1, places=2)
+    monkeypatch.setattr(ingest, "db", app.db)
+    for _ in range(2):
+        asyncio.run(ingest.Ingest(str(path), "jsonl", batch_size=5, concurrency=1, resume=False).run())
+
+    place = asyncio.run(app.store.get_country_place("c0", "c0-p1"))
+    assert place["rev"] == 1
+    assert place["name"] == "Place 1"
+
+
+def test_reingesting_a_country_keeps_and_bumps_revisions(app, tmp_path, monkeypatch):
+    place = {
+        "name": "Place", "description": "d", "image": "i", "price": "$100 - $200", "rating": 4.5,
+        "location": {"lat": 1.0, "lng": 2.0}, "best_time": "May", "duration": "2 days",
+    }
+    country = {"id": "c0", "name": "Country 0", "description": "d", "hero_image": "h"}
+    path = tmp_path / "catalog.jsonl"
+    monkeypatch.setattr(ingest, "db", app.db)
+
+    path.write_text(json.dumps(dict(country, places=[dict(place, id="a"), dict(place, id="b")])) + "\n")
+    asyncio.run(ingest.Ingest(str(path), "jsonl", batch_size=5, concurrency=1, resume=False).run())
+    path.write_text(json.dumps(dict(country, places=[dict(place, id="a", rating=3.0)])) + "\n")
+    asyncio.run(ingest.Ingest(str(path), "jsonl", batch_size=5, concurrency=1, resume=False).run())
+
+    places = asyncio.run(app.store.get_country("c0"))["places"]
+    assert [(p["id"], p["rev"], p["rating"]) for p in places] == [("a", 1, 3.0)]
+
+
+def test_place_id_held_by_another_country_is_rejected(app, tmp_path, monkeypatch):
+    path = tmp_path / "catalog.jsonl"
+    _catalog(path, countries=2, places=5)
+    monkeypatch.setattr(ingest, "db", _Db(app.db, _DuplicateIds(app.db.countries, {"c1-p2"})))
+
+    run = ingest.Ingest(str(path), "jsonl", batch_size=4, concurrency=2, resume=False)
+    assert not asyncio.run(run.run())
+    assert (run.rejected, run.unmatched) == (1, 0)
+    assert not (tmp_path / "catalog.jsonl.checkpoint").exists()
+    rejects = [json.loads(line) for line in (tmp_path / "catalog.jsonl.rejects.jsonl").read_text().splitlines()]
+    assert [r["row"]["id"] for r in rejects] == ["c1-p2"]
+    assert asyncio.run(_place_count(app)) == 9
@@ -0,0 +1,18 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_mock_load_test_runs(tmp_path):
+    output = tmp_path / "results.json"
+    subprocess.run(
+        [sys.executable, str(ROOT / "benchmarks" / "load_test.py"), "--mock", "--sizes", "100",
+         "--concurrency", "2", "--requests", "5", "--duration", "1", "--output", str(output)],
+        check=True, capture_output=True, timeout=300,
+    )
+    results = json.loads(output.read_text())["results"]
+    assert results
+    assert all(r["first_status"] == 200 and r["errors"] == 0 for r in results)
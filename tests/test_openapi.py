@@ -0,0 +1,16 @@
+def _response_refs(schema, path):
+    content = schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    return sorted(
+        variant.get("$ref") or "List[" + variant["items"]["$ref"] + "]" for variant in content["anyOf"]
+    )
+
+
+def test_list_routes_document_every_response_shape(app):
+    schema = app.app.openapi()
+    assert _response_refs(schema, "/api/countries") == [
+        "#/components/schemas/CountryBatch", "List[#/components/schemas/Country]",
+    ]
+    assert _response_refs(schema, "/api/places") == [
+        "#/components/schemas/FacetedPlaces", "#/components/schemas/PlaceBatch",
+        "List[#/components/schemas/Place]",
+    ]
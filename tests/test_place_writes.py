@@ -0,0 +1,159 @@
+import asyncio
+
+import httpx
+
+import catalog_stats
+
+PLACE = {
+    "id": "kyoto-temples", "name": "Kyoto Temples", "description": "Shrines and gardens.",
+    "image": "https://images.unsplash.com/kyoto", "price": "$900 - $1,400", "rating": 4.8,
+    "location": {"lat": 35.0116, "lng": 135.7681}, "best_time": "April", "duration": "3 days",
+}
+
+
+def _run(server, scenario):
+    async def main():
+        await server.store.create_indexes()
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.post("/api/seed")).status_code == 200
+            await scenario(client)
+
+    asyncio.run(main())
+
+
+async def _settled(server):
+    # Writes return before the new catalog is live.
+    if server._refresh_task is not None:
+        await server._refresh_task
+
+
+def test_if_match_preconditions(app):
+    async def scenario(client):
+        url = "/api/countries/india/places/goa"
+        response = await client.patch(url, json={"rating": 4.1})
+        assert response.status_code == 200
+        assert response.headers["etag"] == '"goa-1"'
+
+        stale = await client.patch(url, json={"rating": 4.2}, headers={"If-Match": '"goa-0"'})
+        assert stale.status_code == 412
+        other = await client.patch(url, json={"rating": 4.2}, headers={"If-Match": '"jaipur-1"'})
+        assert other.status_code == 412
+
+        current = await client.patch(url, json={"rating": 4.2}, headers={"If-Match": '"goa-1"'})
+        assert current.headers["etag"] == '"goa-2"'
+        assert (await client.delete(url, headers={"If-Match": '"goa-1"'})).status_code == 412
+        assert (await client.delete(url, headers={"If-Match": '"goa-2"'})).status_code == 204
+        assert (await client.delete(url)).status_code == 404
+
+    _run(app, scenario)
+
+
+def test_read_etag_is_accepted_by_a_write(app):
+    async def scenario(client):
+        url = "/api/countries/india/places/goa"
+        read = await client.get(url)
+        assert read.status_code == 200
+        assert read.headers["etag"] == '"goa-0"'
+        assert read.json()["rev"] == 0
+
+        write = await client.patch(url, json={"rating": 4.4}, headers={"If-Match": read.headers["etag"]})
+        assert write.status_code == 200
+        assert (await client.get(url)).headers["etag"] == write.headers["etag"] == '"goa-1"'
+        assert (await client.get("/api/countries/india/places/nope")).status_code == 404
+
+    _run(app, scenario)
+
+
+def test_single_place_reads_see_a_write_at_once(app):
+    async def scenario(client):
+        before = (await client.get("/api/places/goa")).json()
+        assert (await client.get("/api/countries/india")).status_code == 200
+        stats = (await client.get("/api/countries/india/stats")).json()
+
+        response = await client.patch("/api/countries/india/places/goa", json={"rating": 1.0})
+        assert response.status_code == 200
+        place = (await client.get("/api/places/goa")).json()
+        assert (place["rating"], place["rev"]) == (1.0, before["rev"] + 1)
+        country = (await client.get("/api/countries/india")).json()
+        assert next(p for p in country["places"] if p["id"] == "goa")["rating"] == 1.0
+        assert (await client.get("/api/countries/india/stats")).json()["mean_rating"] < stats["mean_rating"]
+
+    _run(app, scenario)
+
+
+def test_compressed_write_responses_are_not_shared(app):
+    async def scenario(client):
+        description = "A long description that is well worth compressing. " * 40
+        for place_id in ("goa", "jaipur"):
+            response = await client.patch(
+                f"/api/countries/india/places/{place_id}",
+                json={"description": description},
+                headers={"Accept-Encoding": "gzip"},
+            )
+            assert response.headers["content-encoding"] == "gzip"
+            assert response.json()["id"] == place_id
+
+    _run(app, scenario)
+
+
+def test_reads_and_stats_follow_writes(app):
+    async def scenario(client):
+        async def check(place_count):
+            await _settled(app)
+            stats = (await client.get("/api/countries/india/stats")).json()
+            assert stats["place_count"] == place_count
+            country = (await client.get("/api/countries/india")).json()
+            assert len(country["places"]) == place_count
+            rebuilt = catalog_stats.build(await app.store.list_countries())
+            stored = {summary["_id"]: catalog_stats.render(summary) for summary in await app.store.list_stats()}
+            assert stored == {summary["_id"]: catalog_stats.render(summary) for summary in rebuilt}
+
+        before = len((await client.get("/api/countries/india")).json()["places"])
+        url = f"/api/countries/india/places/{PLACE['id']}"
+        assert (await client.post(url, json=PLACE)).status_code == 201
+        assert (await client.post(url, json=PLACE)).status_code == 409
+        await check(before + 1)
+
+        assert (await client.patch(url, json={"rating": 3.9})).status_code == 200
+        await check(before + 1)
+        assert (await client.get(f"/api/places/{PLACE['id']}")).json()["rating"] == 3.9
+
+        assert (await client.delete(url)).status_code == 204
+        await check(before)
+        assert (await client.get(f"/api/places/{PLACE['id']}")).status_code == 404
+
+    _run(app, scenario)
+
+
+def test_catalog_structures_follow_writes(app):
+    async def scenario(client):
+        async def check():
+            await _settled(app)
+            countries = await app.store.list_countries()
+            fresh = app._derive_catalog(countries, app.SearchIndex())
+            live = app.catalog_cache.pinned()
+            for key in ("json:countries:*", "json:places:*", "image_urls"):
+                assert live[key] == fresh[key], key
+            # Scores drift a little between re-based lengths; the hits match.
+            for q in ("temple", "beach", "kyoto", "goa"):
+                hits = [{doc["id"] for doc, _ in index.search(q, limit=20)} for index in (live["search_index"], fresh["search_index"])]
+                assert hits[0] == hits[1], q
+            place_id = countries[0]["places"][0]["id"]
+            # Spliced rows are scaled with frozen statistics, which may swap
+            # near-tied neighbours further down.
+            similar = [[place["id"] for _, place, _ in index.similar(place_id, 3)] for index in (live["similarity_index"], fresh["similarity_index"])]
+            assert similar[0] == similar[1]
+            assert len(live["facet_arrays"]) == len(live["geo_index"]) == len(fresh["facet_arrays"])
+
+        await client.get("/api/search", params={"q": "beach"})
+        await client.post(f"/api/countries/japan/places/{PLACE['id']}", json=PLACE)
+        await check()
+        await client.patch("/api/countries/india/places/goa", json={"name": "Goa Temples"})
+        await check()
+        await client.delete(f"/api/countries/japan/places/{PLACE['id']}")
+        await check()
+        await client.patch("/api/countries/india/places/jaipur", json={"description": "Beach forts."})
+        await check()
+
+    _run(app, scenario)
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from search_index import SearchIndex
+
+# Shared prefixes, so the last query token expands to several terms.
+WORDS = [
+    "sun", "sunny", "sunset", "sunrise", "sundarbans", "sand", "sandstone", "sanctuary",
+    "temple", "temples", "tea", "teak", "mountain", "mount", "mountains", "river", "riviera",
+    "lake", "lakeside", "palace", "palm", "palms", "old", "town", "market", "harbour", "hill",
+    "forest", "fort", "fortress", "island", "isle", "bay", "beach", "beaches", "the", "of",
+]
+
+
+def _corpus(rng, n):
+    docs = []
+    for i in range(n):
+        kind = "country" if i % 10 == 0 else "place"
+        docs.append({
+            "kind": kind,
+            "id": f"{kind}-{i}",
+            "name": " ".join(rng.choices(WORDS, k=rng.randint(1, 3))),
+            "description": " ".join(rng.choices(WORDS, k=rng.randint(0, 25))),
+        })
+    return docs
+
+
+def _exhaustive(index, query, limit, kinds):
+    groups = index._groups(query)
+    if not groups:
+        return []
+    scores = {
+        key: index._score(groups, key, index._norms[key])
+        for key in index._docs if not kinds or key[0] in kinds
+    }
+    ranked = sorted((item for item in scores.items() if item[1]), key=lambda item: (-item[1], item[0]))
+    return [(key[1], score) for key, score in ranked[:limit]]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_search_matches_exhaustive_ranking(seed):
+    rng = random.Random(seed)
+    docs = _corpus(rng, 1500)
+    index = SearchIndex()
+    index.sync(docs, 1)
+    # A second, partial sync leaves some impact orders and norms incremental.
+    changed = [dict(doc, name=" ".join(rng.choices(WORDS, k=2))) for doc in rng.sample(docs, 100)]
+    kept = {doc["id"]: doc for doc in docs[:-50]}
+    kept.update({doc["id"]: doc for doc in changed if doc["id"] in kept})
+    added = [dict(doc, id=f"new-{doc['id']}") for doc in _corpus(random.Random(seed + 100), 40)]
+    index.sync(list(kept.values()) + added, 2)
+
+    for _ in range(150):
+        tokens = rng.choices(WORDS, k=rng.randint(1, 3))
+        if rng.random() < 0.5:
+            tokens[-1] = tokens[-1][:rng.randint(1, len(tokens[-1]))]
+        query = " ".join(tokens)
+        limit = rng.choice([1, 5, 20, 200])
+        kinds = rng.choice([None, {"place"}, {"country"}])
+        found = [(doc["id"], score) for doc, score in index.search(query, limit=limit, kinds=kinds)]
+        expected = _exhaustive(index, query, limit, kinds)
+        assert [doc_id for doc_id, _ in found] == [doc_id for doc_id, _ in expected], (query, limit, kinds)
+        assert [score for _, score in found] == pytest.approx([score for _, score in expected])